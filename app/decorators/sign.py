@@ -1,12 +1,39 @@
+import hmac
+
 from fastapi import FastAPI, Request, Response
 from fastapi.logger import logger
 from functools import wraps
 
+from app.utils.cache import LRUCache
 from app.utils.config import settings
+from app.utils.metrics import metrics
 from app.utils.sign import CustomHasher
 
 app = FastAPI()
 
+hasher = CustomHasher()
+
+# Expected signatures keyed by request URL; retries and prefetches replay the same URLs
+signature_cache = LRUCache(max_items=settings.SIGN_CACHE_SIZE)
+metrics.register("sign_cache", signature_cache.stats)
+
+
+def expected_signature(url: str) -> str:
+    """
+    Returns the signature a client must send for a URL.
+
+    Args:
+        url (str): The full request URL.
+
+    Returns:
+        str: The signature.
+    """
+    signature = signature_cache.get(url)
+    if signature is None:
+        signature = hasher.custom_hash(url)
+        signature_cache.set(url, signature)
+    return signature
+
 
 def sign_validator(func):
     @wraps(func)
@@ -19,12 +46,12 @@ def sign_validator(func):
                 return Response(status_code=400)
 
             try:
-                _hash = CustomHasher().custom_hash(str(request.url))
+                _hash = expected_signature(str(request.url))
             except Exception as e:
                 logger.warning(f"Error generating hash for {request.url}. Exception: {e}")
                 return Response(status_code=400)
 
-            if _hash != client_sign:
+            if not hmac.compare_digest(_hash.encode(), client_sign.encode()):
                 logger.warning(f"Invalid hash for {request.url}")
                 return Response(status_code=400)
 
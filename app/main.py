@@ -1,19 +1,36 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.staticfiles import StaticFiles
 
 from app.middleware.node import NodeMiddleware
 from app.middleware.process_time import ProcessTimeMiddleware
+from app.middleware.rate_limit import RateLimitMiddleware
 from app.middleware.referer import RefererCheckMiddleware
+from app.middleware.trusted_host import TrustedHostMiddleware
 
 from asgi_correlation_id import CorrelationIdMiddleware
 
 from app.routes import router
 from app.utils.config import settings
+from app.utils.cookies import cookie_provider
+from app.utils.extractor import INFO_OPTIONS, extraction_pool, load_yt_dlp
+from app.utils.hosts import host_matcher
+from app.utils.http import upstream
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """Warms up the worker resources on startup and releases them on shutdown"""
+    await upstream.start()
+    host_matcher()
+    await cookie_provider.start()
+    extraction_pool.warm_up(INFO_OPTIONS, cookie_provider.header)
+    yield
+    await cookie_provider.stop()
+    extraction_pool.shutdown()
+    await upstream.close()
 
-# Parse the allowed hosts from the settings
-allowed_hosts = settings.ALLOWED_HOSTS.split(",")
 
 # Initialize the FastAPI application
 app = FastAPI(
@@ -21,14 +38,21 @@ app = FastAPI(
     description="Proxy for the unofficial YouTube client",
     version="beta",
     docs_url="/",
+    lifespan=lifespan,
     # Disable OpenAPI schema if specified in settings
     openapi_url=None if bool(settings.DISABLE_DOCS) else "/openapi.json"
 )
 
 # Conditionally mount static files if demo mode is not disabled
 if not bool(settings.DISABLE_DEMO):
+    from fastapi.staticfiles import StaticFiles
     app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# Add the rate limiter first, so it runs inside the CORS and request ID middlewares and its 429
+# responses carry their headers; it still rejects before any route work
+if not bool(settings.DISABLE_RATE_LIMIT):
+    app.add_middleware(RateLimitMiddleware)  # type: ignore[no-untyped-call]
+
 app.add_middleware(
     CorrelationIdMiddleware,  # type: ignore[no-untyped-call]
     header_name='X-FAN-Request-ID'  # FAN - FastAPI Node
@@ -40,15 +64,13 @@ app.add_middleware(
     allow_origins=["*"],  # Allow requests from any origin
     allow_credentials=True,  # Allow credentials in requests
     allow_methods=["GET"],  # Allow only GET requests
-    allow_headers=["X-Secret", "X-Sign", "X-Client-Host"],  # Allow specific headers
-    expose_headers=['X-FAN-Request-ID']
+    # Allow specific headers, including the range and conditional headers of segment requests
+    allow_headers=["X-Secret", "X-Sign", "X-Client-Host", "Range", "If-Range", "If-None-Match", "If-Modified-Since"],
+    expose_headers=['X-FAN-Request-ID', 'Content-Range', 'Accept-Ranges', 'ETag', 'Last-Modified', 'Retry-After']
 )
 
 # Add middleware to restrict requests to allowed hosts
-app.add_middleware(
-    TrustedHostMiddleware,  # type: ignore[no-untyped-call]
-    allowed_hosts=allowed_hosts  # Restrict requests to these hosts
-)
+app.add_middleware(TrustedHostMiddleware)  # type: ignore[no-untyped-call]
 
 # Add custom middlewares
 app.add_middleware(NodeMiddleware)  # type: ignore[no-untyped-call]
@@ -57,3 +79,8 @@ app.add_middleware(RefererCheckMiddleware)  # type: ignore[no-untyped-call]
 
 # Include application routes
 app.include_router(router)
+
+# With gunicorn --preload the application is imported once before the workers are forked,
+# so yt_dlp is imported here too and its pages are shared copy-on-write by all workers
+if bool(settings.PRELOAD_APP):
+    load_yt_dlp()
@@ -1,35 +1,40 @@
 import platform
-from typing import Callable
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 
-class NodeMiddleware(BaseHTTPMiddleware):
+class NodeMiddleware:
     """
     Middleware that adds a header to the response
     with the identifier of the server (node) that processed the request.
+
+    Implemented as plain ASGI middleware: the header is injected into the
+    `http.response.start` message and the body passes through untouched.
     """
 
     def __init__(self, app: ASGIApp) -> None:
-        super().__init__(app)
+        self.app = app
+        # The node name does not change while the worker runs
+        self.node = platform.node()
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         Processes the incoming request and adds a custom header to the response.
 
         Args:
-            request (Request): The incoming request object.
-            call_next (Callable): The next middleware or route handler.
-
-        Returns:
-            Response: The response object with the added header.
+            scope (Scope): The ASGI connection scope.
+            receive (Receive): The ASGI receive channel.
+            send (Send): The ASGI send channel.
         """
-        # Call the next middleware or route handler
-        response = await call_next(request)
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        # Add the server's identifier (node name) to the response headers
-        response.headers["X-Dl-App-Node"] = platform.node()
+        async def send_with_node(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Add the server's identifier (node name) to the response headers
+                MutableHeaders(scope=message)["X-Dl-App-Node"] = self.node
+            await send(message)
 
-        return response
+        await self.app(scope, receive, send_with_node)
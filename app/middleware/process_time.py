@@ -1,38 +1,41 @@
 import time
-from typing import Callable
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 
-class ProcessTimeMiddleware(BaseHTTPMiddleware):
+class ProcessTimeMiddleware:
     """
     Middleware to measure the processing time of requests and add it to the response headers.
+
+    Implemented as plain ASGI middleware: the time until the response starts is measured,
+    as before, and the body passes through untouched.
     """
 
     def __init__(self, app: ASGIApp) -> None:
-        super().__init__(app)
+        self.app = app
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         Measures the time taken to process the request and adds it to the response headers.
 
         Args:
-            request (Request): The incoming request object.
-            call_next (Callable): The next middleware or route handler.
-
-        Returns:
-            Response: The response object with the added processing time header.
+            scope (Scope): The ASGI connection scope.
+            receive (Receive): The ASGI receive channel.
+            send (Send): The ASGI send channel.
         """
-        # Record the start time before processing the request
-        start_time = time.time()
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        # Process the request by calling the next middleware or route handler
-        response = await call_next(request)
+        # Record the start time before processing the request
+        start_time = time.perf_counter()
 
-        # Calculate the processing time in milliseconds
-        process_time = time.time() - start_time
-        response.headers["X-Process-Time"] = f"{int(process_time * 1000)} ms"
+        async def send_with_process_time(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Calculate the processing time in milliseconds
+                process_time = time.perf_counter() - start_time
+                MutableHeaders(scope=message)["X-Process-Time"] = f"{int(process_time * 1000)} ms"
+            await send(message)
 
-        return response
+        await self.app(scope, receive, send_with_process_time)
@@ -0,0 +1,56 @@
+from fastapi.responses import Response
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.utils.config import settings
+from app.utils.ratelimit import rate_limiter
+
+# Route classes with separate budgets, by path prefix
+ROUTE_CLASSES = (
+    ("/v1/video/", "video"),
+    ("/v1/manifest/hls/", "manifest"),
+    ("/v1/manifest/segment/", "segment"),
+)
+
+
+class RateLimitMiddleware:
+    """
+    Middleware to limit the request rate of the extraction, manifest and segment routes.
+
+    Runs inside the CORS and request ID middlewares, so 429 responses carry their headers
+    and browsers can read Retry-After, but before any token decryption or upstream request.
+    CORS preflight requests are not counted.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Takes a token of the route class for the client, answering with 429 when none is left.
+
+        Args:
+            scope (Scope): The ASGI connection scope.
+            receive (Receive): The ASGI receive channel.
+            send (Send): The ASGI send channel.
+        """
+        if scope["type"] == "http" and scope["method"] != "OPTIONS":
+            path = scope["path"]
+            for prefix, route_class in ROUTE_CLASSES:
+                if path.startswith(prefix):
+                    # Determine the client the same way the tokens are bound to it
+                    client = scope["client"][0] if scope.get("client") else ""
+                    if settings.REST_MODE:
+                        client = Headers(scope=scope).get("X-Client-Host") or client
+
+                    wait = rate_limiter.check(route_class, client)
+                    if wait:
+                        response = Response(
+                            status_code=429,
+                            headers={"Retry-After": rate_limiter.retry_after(wait)}
+                        )
+                        await response(scope, receive, send)
+                        return
+                    break
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,44 @@
+from fastapi.responses import PlainTextResponse, RedirectResponse
+from starlette.datastructures import URL, Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.utils.hosts import host_matcher
+
+
+class TrustedHostMiddleware:
+    """
+    Middleware to restrict requests to the allowed hosts (`ALLOWED_HOSTS`).
+
+    Behaves like Starlette's TrustedHostMiddleware, including the redirect to the
+    www. host, but validates through the shared host matcher, which is built once
+    and follows changes of the setting.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Validates the Host header, answering rejected requests with a 400 status code.
+
+        Args:
+            scope (Scope): The ASGI connection scope.
+            receive (Receive): The ASGI receive channel.
+            send (Send): The ASGI send channel.
+        """
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        matcher = host_matcher()
+        host = Headers(scope=scope).get("host", "").split(":")[0]
+        if matcher.match_host(host):
+            await self.app(scope, receive, send)
+            return
+
+        if matcher.www_redirect(host):
+            url = URL(scope=scope)
+            response = RedirectResponse(url=str(url.replace(netloc="www." + url.netloc)))
+        else:
+            response = PlainTextResponse("Invalid host header", status_code=400)
+        await response(scope, receive, send)
@@ -52,3 +52,11 @@ class YouTubeResponse(BaseModel):
     fps: Optional[int] = None
     filesize_approx: Optional[int] = None
     comments: Optional[List[Comment]] = []
+
+
+class CommentsResponse(BaseModel):
+    id: str
+    page: int
+    page_size: int
+    total: int
+    comments: List[Comment] = []
@@ -1,12 +1,18 @@
 from fastapi import APIRouter
 
 from app.utils.config import settings
-from . import templates, healthz, v1
+from . import healthz, metrics, v1
 
 router = APIRouter()
 
 if not bool(settings.DISABLE_DEMO):
+    # Imported only when enabled, as it loads Jinja
+    from . import templates
     router.include_router(templates.router)
 
 router.include_router(healthz.router)
+
+if bool(settings.ENABLE_METRICS):
+    router.include_router(metrics.router)
+
 router.include_router(v1.router)
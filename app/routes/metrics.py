@@ -0,0 +1,29 @@
+"""
+Route handler for /metrics
+"""
+
+import hmac
+import os
+from typing import Annotated
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import JSONResponse
+
+from app.models.error import HTTPError
+from app.utils.config import settings
+from app.utils.metrics import metrics
+
+router = APIRouter()
+
+
+@router.get(
+    "/metrics",
+    summary="Runtime counters of the worker",
+    responses={200: {}, 401: {"model": HTTPError}},
+    tags=["Service"]
+)
+async def get_metrics(x_secret: Annotated[str | None, Header()] = None) -> JSONResponse:
+    """Request handler, restricted to clients sending the secret key in the X-Secret header"""
+    if not x_secret or not hmac.compare_digest(x_secret.encode(), settings.SECRET_KEY.encode()):
+        raise HTTPException(status_code=401)
+    return JSONResponse({"pid": os.getpid(), **metrics.collect()})
@@ -1,25 +1,126 @@
+import asyncio
 import re
+from dataclasses import dataclass
+from time import time
+from typing import AsyncIterator, Mapping
 
-from aiohttp import ClientSession
 from cryptography.fernet import InvalidToken
 from fastapi import Request, APIRouter, HTTPException
 from fastapi.logger import logger
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from pydantic import ValidationError
+from starlette.background import BackgroundTask
 from yarl import URL
 
 from app.decorators.sign import sign_validator
 
-from app.models.crypto import CryptoObject
 from app.models.error import HTTPError
+from app.utils.cache import LRUCache
 from app.utils.config import settings
-from app.utils.crypto import Cryptography
+from app.utils.dlp_utils import EXPIRE_PATTERN
 from app.utils.hls import HLSReplacer
+from app.utils.http import upstream
+from app.utils.metrics import metrics
+from app.utils.singleflight import SingleFlight
+from app.utils.tokens import token_resolver
 
 router = APIRouter()
 
 MANIFEST_TOKEN_PATTERN = re.compile(r'\.[a-zA-Z0-9]+$')
-cryptography = Cryptography()
+MAX_AGE_PATTERN = re.compile(r'(?:^|[,\s])max-age=(\d+)')
+TARGET_DURATION_PATTERN = re.compile(r'^#EXT-X-TARGETDURATION:(\d+)', re.MULTILINE)
+
+# Seconds before the signed upstream URL expires after which a cached manifest is no longer served
+CACHE_EXPIRE_MARGIN = 900
+
+# Upstream manifest bodies keyed by URL, before the per-client URL rewrite
+manifest_cache = LRUCache(max_items=settings.MANIFEST_CACHE_SIZE, max_bytes=settings.MANIFEST_CACHE_BYTES)
+metrics.register("manifest_cache", manifest_cache.stats)
+
+# Concurrent requests for the same manifest share a single upstream fetch
+manifest_fetches = SingleFlight()
+metrics.register("manifest_fetches", manifest_fetches.stats)
+
+
+class ManifestStreamAborted(Exception):
+    """The request streaming a manifest from upstream ended before it was received."""
+
+
+@dataclass
+class CachedManifest:
+    body: str
+    content_type: str
+
+
+def manifest_ttl(url: str, headers: Mapping[str, str], body: str) -> float:
+    """
+    Computes how long an upstream manifest may be served from the cache.
+
+    The TTL is capped by `MANIFEST_CACHE_TTL`, the upstream Cache-Control max-age, and ends
+    `CACHE_EXPIRE_MARGIN` seconds before the signed upstream URL expires. Live media playlists
+    (without EXT-X-ENDLIST) are only cached for half of their target duration.
+
+    Args:
+        url (str): The upstream manifest URL.
+        headers (Mapping[str, str]): The upstream response headers.
+        body (str): The manifest body.
+
+    Returns:
+        float: The TTL in seconds. Values less than or equal to zero mean the manifest must not be cached.
+    """
+    ttl = settings.MANIFEST_CACHE_TTL
+
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0
+    max_age = MAX_AGE_PATTERN.search(cache_control)
+    if max_age:
+        age = headers.get("Age", "")
+        ttl = min(ttl, int(max_age.group(1)) - (int(age) if age.isdigit() else 0))
+
+    expire = EXPIRE_PATTERN.search(url)
+    if expire:
+        ttl = min(ttl, int(expire.group(1)) - time() - CACHE_EXPIRE_MARGIN)
+
+    if "#EXTINF" in body and "#EXT-X-ENDLIST" not in body:
+        target_duration = TARGET_DURATION_PATTERN.search(body)
+        ttl = min(ttl, int(target_duration.group(1)) / 2 if target_duration else 1)
+    return ttl
+
+
+def store_manifest(url: str, headers: Mapping[str, str], manifest: CachedManifest) -> None:
+    """
+    Stores an upstream manifest in the cache for its TTL, if it may be cached.
+
+    Args:
+        url (str): The upstream manifest URL.
+        headers (Mapping[str, str]): The upstream response headers.
+        manifest (CachedManifest): The manifest body and content type.
+    """
+    ttl = manifest_ttl(url, headers, manifest.body)
+    if ttl > 0:
+        manifest_cache.set(url, manifest, ttl=ttl, size=len(manifest.body))
+
+
+async def load_manifest(url: str) -> CachedManifest:
+    """
+    Fetches a manifest from upstream and stores it in the cache.
+
+    Args:
+        url (str): The upstream manifest URL.
+
+    Returns:
+        CachedManifest: The manifest body and content type.
+    """
+    async with upstream.session.get(URL(url, encoded=True)) as response:
+        response.raise_for_status()
+        manifest = CachedManifest(
+            body=await response.text(),
+            content_type=response.headers.get('Content-Type', 'application/vnd.apple.mpegurl')
+        )
+
+    store_manifest(url, response.headers, manifest)
+    return manifest
 
 
 @router.get(
@@ -39,13 +140,10 @@ async def hls_manifest(request: Request, manifest_token: str) -> Response:
     """Request handler"""
     try:
         token = MANIFEST_TOKEN_PATTERN.sub('', manifest_token)
-        data = cryptography.decrypt_json(token)
+        data = token_resolver.resolve(token)
     except InvalidToken as e:
         logger.warning(f"Error validation manifest token. Details: {e}")
         raise HTTPException(status_code=400)
-
-    try:
-        data = CryptoObject(**data)
     except ValidationError as e:
         raise HTTPException(status_code=503, detail=str(e))
 
@@ -54,14 +152,70 @@ async def hls_manifest(request: Request, manifest_token: str) -> Response:
             logger.warning(f"Client IP is invalid. C:{str(data.client_host)} F:{request.client.host}")
             raise HTTPException(status_code=400)
 
-    async with ClientSession() as session:
+    url = str(data.url)
+    cache_enabled = settings.MANIFEST_CACHE_SIZE > 0
+    if cache_enabled:
+        manifest = manifest_cache.get(url)
+        if manifest is None and manifest_fetches.in_flight(url):
+            # Another request is receiving the manifest; wait for it instead of fetching it again
+            try:
+                try:
+                    manifest = await manifest_fetches.do(url, lambda: load_manifest(url))
+                except ManifestStreamAborted:
+                    # Its client went away before the manifest was received; fetch it again
+                    manifest = await manifest_fetches.do(url, lambda: load_manifest(url))
+            except Exception as e:
+                raise HTTPException(status_code=503, detail=str(e))
+        if manifest is not None:
+            return Response(
+                HLSReplacer.replace_manifest_links(manifest.body, request),
+                media_type=manifest.content_type
+            )
+
+    # On a cache miss the manifest is rewritten while it is received, and the body is stored
+    # in the cache once complete; concurrent requests for it join this fetch until then
+    received = manifest_fetches.lead(url) if cache_enabled else None
+    try:
+        response = await upstream.session.get(URL(url, encoded=True))
+        response.raise_for_status()
+    except asyncio.CancelledError:
+        if received is not None:
+            received.set_exception(ManifestStreamAborted(url))
+        raise
+    except Exception as e:
+        if received is not None:
+            received.set_exception(e)
+        raise HTTPException(status_code=503, detail=str(e))
+
+    content_type = response.headers.get('Content-Type', 'application/vnd.apple.mpegurl')
+    replacer = HLSReplacer(request)
+    body = bytearray()
+
+    async def receive() -> AsyncIterator[bytes]:
+        async for chunk in response.content.iter_any():
+            if received is not None:
+                body.extend(chunk)
+            yield chunk
+
+    async def stream_manifest() -> AsyncIterator[str]:
         try:
-            async with session.get(URL(str(data.url), encoded=True)) as response:
-                response.raise_for_status()
-                resp = await response.text()
-                return Response(
-                    HLSReplacer.replace_manifest_links(resp, request),
-                    media_type=response.headers.get('Content-Type', 'application/vnd.apple.mpegurl')
-                )
-        except Exception as e:
-            raise HTTPException(status_code=503, detail=str(e))
+            async for chunk in replacer.stream(receive()):
+                yield chunk
+            if received is not None:
+                manifest = CachedManifest(body=body.decode(), content_type=content_type)
+                store_manifest(url, response.headers, manifest)
+                received.set_result(manifest)
+        finally:
+            await release()
+
+    async def release() -> None:
+        response.release()
+        if received is not None and not received.done():
+            received.set_exception(ManifestStreamAborted(url))
+
+    return StreamingResponse(
+        content=stream_manifest(),
+        media_type=content_type,
+        # Runs even when the client disconnects before the manifest is streamed
+        background=BackgroundTask(release)
+    )
@@ -1,25 +1,31 @@
 import re
 from typing import AsyncIterable
 
-from aiohttp import ClientSession, ClientResponseError
+from aiohttp import ClientError
 from cryptography.fernet import InvalidToken
 from fastapi import Request, APIRouter, HTTPException
 from fastapi.logger import logger
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import ValidationError
+from starlette.background import BackgroundTask
 from yarl import URL
 
 from app.decorators.sign import sign_validator
 
-from app.models.crypto import CryptoObject
 from app.models.error import HTTPError
 from app.utils.config import settings
-from app.utils.crypto import Cryptography
+from app.utils.http import iter_adaptive, upstream
+from app.utils.prefetch import prefetcher
+from app.utils.segment_cache import segment_cache, segment_cache_key
+from app.utils.tokens import token_resolver
 
 router = APIRouter()
 
 SEGMENT_TOKEN_PATTERN = re.compile(r'\.[a-zA-Z0-9]+$')
-cryptography = Cryptography()
+
+# Request headers passed to the upstream and response headers passed back to the client
+FORWARDED_HEADERS = ("Range", "If-Range", "If-None-Match", "If-Modified-Since")
+RELAYED_HEADERS = ("Content-Length", "Content-Range", "Accept-Ranges", "ETag", "Last-Modified")
 
 
 @router.get(
@@ -27,23 +33,24 @@ cryptography = Cryptography()
     summary="Get video segment (HLS stream)",
     responses={
         200: {"content": {"application/octet-stream": {}}},
+        206: {"content": {"application/octet-stream": {}}},
+        304: {},
         400: {"model": HTTPError},
+        416: {"model": HTTPError},
         500: {"model": HTTPError},
+        502: {"model": HTTPError},
     },
     tags=["Util"]
 )
 @sign_validator
-async def segment(request: Request, segment_token: str) -> StreamingResponse:
+async def segment(request: Request, segment_token: str) -> Response:
     """Request handler"""
     try:
         token = SEGMENT_TOKEN_PATTERN.sub('', segment_token)
-        data = cryptography.decrypt_json(token)
+        data = token_resolver.resolve(token)
     except InvalidToken as e:
         logger.warning(f"Error validation segment token. Details: {e}")
         raise HTTPException(status_code=400)
-
-    try:
-        data = CryptoObject(**data)
     except ValidationError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -52,13 +59,76 @@ async def segment(request: Request, segment_token: str) -> StreamingResponse:
             logger.warning(f"Client IP is invalid. C:{str(data.client_host)} F:{request.client.host}")
             raise HTTPException(status_code=400)
 
+    # Forward range and conditional headers so players can seek, resume and revalidate
+    headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+
+    if prefetcher.enabled and not headers:
+        prefetcher.schedule(str(data.url))
+        prefetched = await prefetcher.take(str(data.url))
+        if prefetched:
+            return Response(content=prefetched.body, headers=prefetched.headers, media_type=prefetched.content_type)
+
+    # Only plain full-segment requests are served from and stored into the disk cache
+    cache_key = segment_cache_key(str(data.url)) if segment_cache.enabled and not headers else None
+    if cache_key:
+        cached = await segment_cache.lookup(cache_key)
+        if cached:
+            return FileResponse(cached.path, media_type=cached.content_type, stat_result=cached.stat)
+
+    # Content-Length is relayed as is, so the body must not be decompressed on the way
+    headers["Accept-Encoding"] = "identity"
+
+    try:
+        resp = await upstream.session.get(URL(str(data.url), encoded=True), headers=headers)
+    except ClientError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if resp.status >= 400:
+        resp.release()
+        logger.warning(f"Upstream responded with {resp.status} for segment {data.url}")
+        # No upstream headers are relayed, as they describe the upstream body and not the error body
+        raise HTTPException(status_code=resp.status if resp.status < 500 else 502)
+
+    relayed = {name: resp.headers[name] for name in RELAYED_HEADERS if name in resp.headers}
+
+    if resp.status == 304:
+        resp.release()
+        return Response(status_code=304, headers=relayed)
+
+    content_type = resp.headers.get("Content-Type", "application/octet-stream")
+    writer = None
+    if cache_key and resp.status == 200:
+        writer = segment_cache.writer(cache_key, content_type, resp.content_length)
+
     async def stream_video() -> AsyncIterable[bytes]:
-        async with ClientSession() as session:
-            try:
-                async with session.get(URL(str(data.url), encoded=True)) as resp:
-                    async for chunk in resp.content.iter_chunked(16 * 1024):
-                        yield chunk
-            except ClientResponseError as _e:
-                raise HTTPException(status_code=500, detail=str(_e))
-
-    return StreamingResponse(content=stream_video(), media_type="application/octet-stream")
+        nonlocal writer
+        completed = False
+        try:
+            async for chunk in iter_adaptive(resp.content, settings.STREAM_CHUNK_MIN, settings.STREAM_CHUNK_MAX):
+                if writer:
+                    try:
+                        await writer.write(chunk)
+                    except OSError as e:
+                        logger.warning(f"Error writing segment cache entry. Details: {e}")
+                        writer.abort()
+                        writer = None
+                yield chunk
+            completed = True
+        finally:
+            resp.release()
+            if writer and not completed:
+                writer.abort()
+            elif writer:
+                await writer.commit()
+
+    async def release() -> None:
+        # Runs even when the client disconnects before the body is streamed
+        resp.release()
+
+    return StreamingResponse(
+        content=stream_video(),
+        status_code=resp.status,
+        headers=relayed,
+        media_type=content_type,
+        background=BackgroundTask(release)
+    )
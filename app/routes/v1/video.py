@@ -1,55 +1,152 @@
 """
-Route handler for /v1/video/{video_id}
+Route handlers for /v1/video/{video_id} and /v1/video/{video_id}/comments
 """
 
 import asyncio
-from typing import Annotated, Dict, Any
+from time import time
+from typing import Annotated, Awaitable, Callable, Dict, Any, List
 
-import yt_dlp
-from fastapi import Request, HTTPException, APIRouter, Header
-from fastapi.encoders import jsonable_encoder
+from fastapi import Request, HTTPException, APIRouter, Header, Query
 from fastapi.logger import logger
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
 
 from app.models.error import HTTPError
-from app.models.ytdlp import YouTubeResponse
+from app.models.ytdlp import CommentsResponse, YouTubeResponse
+from app.utils.cache import LRUCache, estimate_size
 from app.utils.config import settings
 from app.utils.dlp_utils import DLPUtils
-from app.utils.cookies import CookieConverter
+from app.utils.extractor import FULL_OPTIONS, INFO_OPTIONS, ExtractorOverloaded, extraction_pool, ydl_pool
+from app.utils.cookies import cookie_provider
 from app.utils.url_replacer import URLValidator
-from app.utils.turnstile import TurnstileValidator
+from app.utils.metrics import metrics
+from app.utils.singleflight import SingleFlight
+from app.utils.turnstile import turnstile_validator
 
 router = APIRouter()
 
+# Seconds before the googlevideo URLs expire after which a cached info dict is no longer served
+CACHE_EXPIRE_MARGIN = 900
 
-async def extract_info_async(ydl: yt_dlp.YoutubeDL, video_url: str) -> Dict[str, Any]:
+# Raw extractor results keyed by video ID, before the per-client URL rewrite
+video_cache = LRUCache(
+    max_items=settings.VIDEO_CACHE_SIZE,
+    max_bytes=settings.VIDEO_CACHE_BYTES,
+    ttl=settings.VIDEO_CACHE_TTL
+)
+metrics.register("video_cache", video_cache.stats)
+
+# Concurrent requests for the same video share a single extraction
+extractions = SingleFlight()
+metrics.register("video_extractions", extractions.stats)
+
+# Comments keyed by video ID, extracted separately from the video information in the lazy comments mode
+comments_cache = LRUCache(
+    max_items=settings.COMMENTS_CACHE_SIZE,
+    max_bytes=settings.COMMENTS_CACHE_BYTES,
+    ttl=settings.VIDEO_CACHE_TTL
+)
+metrics.register("comments_cache", comments_cache.stats)
+
+comment_extractions = SingleFlight()
+metrics.register("comment_extractions", comment_extractions.stats)
+metrics.register("extraction_pool", extraction_pool.stats)
+metrics.register("ydl_pool", ydl_pool.stats)
+
+
+def cache_ttl(info: Dict[str, Any]) -> int:
     """
-    Asynchronously extract information from a YouTube video URL using yt_dlp.
+    Computes how long an info dict may be served from the cache.
+
+    The TTL is capped by `VIDEO_CACHE_TTL` and ends `CACHE_EXPIRE_MARGIN` seconds
+    before the earliest signed googlevideo URL in the info dict expires.
 
     Args:
-        ydl (yt_dlp.YoutubeDL): An instance of the yt_dlp.YoutubeDL class.
-        video_url (str): The URL of the YouTube video.
+        info (Dict[str, Any]): The info dict returned by yt_dlp.
 
     Returns:
-        Dict[str, Any]: A dictionary containing the extracted video information.
+        int: The TTL in seconds. Values less than or equal to zero mean the info dict must not be cached.
     """
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, ydl.extract_info, video_url, False)
+    ttl = settings.VIDEO_CACHE_TTL
+    expire = DLPUtils.get_expire(info)
+    if expire:
+        ttl = min(ttl, expire - int(time()) - CACHE_EXPIRE_MARGIN)
+    return ttl
 
 
-@router.get(
-    "/video/{video_id}",
-    summary="Get video information",
-    responses={
-        200: {"model": YouTubeResponse},
-        400: {"model": HTTPError},
-        401: {"model": HTTPError}
-    },
-    tags=["Video"]
-)
-async def fetch(request: Request, video_id: str, x_secret: Annotated[str | None, Header()] = None) -> JSONResponse:
-    """Request handler"""
-    logger.info(f"Client {request.client.host} requested video {video_id} with X-Secret {x_secret}")
+def store_video_info(video_id: str, info: Dict[str, Any]) -> bool:
+    """
+    Stores an info dict in the video cache unless its URLs expire too soon.
+
+    Args:
+        video_id (str): The YouTube video ID.
+        info (Dict[str, Any]): The info dict returned by yt_dlp.
+
+    Returns:
+        bool: True if the info dict was cached.
+    """
+    ttl = cache_ttl(info)
+    if ttl <= 0:
+        return False
+    video_cache.set(video_id, info, ttl=ttl, size=estimate_size(info))
+    return True
+
+
+async def load_video_info(video_id: str) -> Dict[str, Any]:
+    """
+    Extracts the information of a video with yt_dlp and stores it in the cache.
+
+    Args:
+        video_id (str): The YouTube video ID.
+
+    Returns:
+        Dict[str, Any]: The info dict returned by yt_dlp.
+    """
+    info = await extraction_pool.run(
+        f"https://www.youtube.com/watch?v={video_id}", INFO_OPTIONS, cookie_provider.header
+    )
+    store_video_info(video_id, info)
+    return info
+
+
+async def load_comments(video_id: str) -> List[Dict[str, Any]]:
+    """
+    Extracts the comments of a video with yt_dlp and stores them in the cache.
+
+    The extraction also returns the video information, which is stored in the video
+    cache as /v1/video would have, so the video does not cost a second extraction.
+
+    Args:
+        video_id (str): The YouTube video ID.
+
+    Returns:
+        List[Dict[str, Any]]: The comments returned by yt_dlp.
+    """
+    info = await extraction_pool.run(
+        f"https://www.youtube.com/watch?v={video_id}", FULL_OPTIONS, cookie_provider.header
+    )
+
+    _comments = info.get('comments') or []
+    if bool(settings.LAZY_COMMENTS):
+        comments_cache.set(video_id, _comments, size=estimate_size(_comments))
+        store_video_info(video_id, {key: value for key, value in info.items() if key != 'comments'})
+    elif not store_video_info(video_id, info):
+        # Outside the lazy comments mode the comments are served from the cached video information
+        comments_cache.set(video_id, _comments, size=estimate_size(_comments))
+    return _comments
+
+
+async def authorize(request: Request, video_id: str, x_secret: str | None) -> None:
+    """
+    Validates the video ID and the X-Secret header (secret key or Turnstile token).
+
+    Args:
+        request (Request): The incoming request object.
+        video_id (str): The YouTube video ID.
+        x_secret (str | None): The value of the X-Secret header.
+
+    Raises:
+        HTTPException: 401 if the secret is missing or invalid, 400 if the video ID is invalid.
+    """
     if not x_secret:
         raise HTTPException(status_code=401)
 
@@ -62,31 +159,116 @@ async def fetch(request: Request, video_id: str, x_secret: Annotated[str | None,
             logger.warning(f"x_secret != settings.SECRET_KEY for {request.client.host}")
             raise HTTPException(status_code=401)
     else:
-        turnstile_status = await TurnstileValidator().validate(x_secret)
+        turnstile_status = await turnstile_validator.validate(x_secret)
         if not turnstile_status:
             logger.warning(f"Not valid turnstile key for {request.client.host}")
             raise HTTPException(status_code=401)
 
-    yt_dlp_options = {
-        'no_warnings': True,
-        'noprogress': True,
-        'quiet': True,
-        'getcomments': True,
-        'extractor_args': {
-            'youtube': {
-                'comment_sort': ['top'],
-                'max_comments': ['100', 'all', '0', '0'],
-            }
-        },
-        'http_headers': {"Cookie": CookieConverter(settings.COOKIES).convert()},
-    }
-    with yt_dlp.YoutubeDL(yt_dlp_options) as ydl:
-        try:
-            resp = await extract_info_async(ydl, f"https://www.youtube.com/watch?v={video_id}")
-            _validator = URLValidator(request)
-            return JSONResponse(
-                content=jsonable_encoder(_validator.replace_urls(resp).model_dump())
-            )
-        except Exception as e:
-            logger.warning(f"Error fetch video with ID:{video_id}. Error details: {e}")
-            raise HTTPException(status_code=500, detail="Internal application error")
+
+async def extract(flights: SingleFlight, video_id: str, loader: Callable[[str], Awaitable[Any]]) -> Any:
+    """
+    Runs an extraction through the single-flight group and maps its failures to HTTP errors.
+
+    Args:
+        flights (SingleFlight): The single-flight group of the extraction kind.
+        video_id (str): The YouTube video ID.
+        loader (Callable[[str], Awaitable[Any]]): The coroutine function performing the extraction.
+
+    Returns:
+        Any: The extraction result.
+    """
+    try:
+        return await flights.do(video_id, lambda: loader(video_id))
+    except ExtractorOverloaded:
+        logger.warning(f"Extraction queue is full, rejected video {video_id}")
+        raise HTTPException(
+            status_code=503,
+            detail="Service overloaded",
+            headers={"Retry-After": str(settings.EXTRACT_RETRY_AFTER)}
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Extraction of video {video_id} timed out")
+        raise HTTPException(status_code=504, detail="Extraction timed out")
+    except Exception as e:
+        logger.warning(f"Error fetch video with ID:{video_id}. Error details: {e}")
+        raise HTTPException(status_code=500, detail="Internal application error")
+
+
+@router.get(
+    "/video/{video_id}",
+    summary="Get video information",
+    responses={
+        200: {"model": YouTubeResponse},
+        400: {"model": HTTPError},
+        401: {"model": HTTPError},
+        503: {"model": HTTPError},
+        504: {"model": HTTPError}
+    },
+    tags=["Video"]
+)
+async def fetch(request: Request, video_id: str, x_secret: Annotated[str | None, Header()] = None) -> Response:
+    """Request handler"""
+    logger.info(f"Client {request.client.host} requested video {video_id} with X-Secret {x_secret}")
+    await authorize(request, video_id, x_secret)
+
+    info = video_cache.get(video_id)
+    if info is None:
+        info = await extract(extractions, video_id, load_video_info)
+
+    try:
+        _validator = URLValidator(request)
+        return Response(
+            content=_validator.replace_urls(info).model_dump_json(),
+            media_type="application/json"
+        )
+    except Exception as e:
+        logger.warning(f"Error fetch video with ID:{video_id}. Error details: {e}")
+        raise HTTPException(status_code=500, detail="Internal application error")
+
+
+@router.get(
+    "/video/{video_id}/comments",
+    summary="Get video comments",
+    responses={
+        200: {"model": CommentsResponse},
+        400: {"model": HTTPError},
+        401: {"model": HTTPError},
+        503: {"model": HTTPError},
+        504: {"model": HTTPError}
+    },
+    tags=["Video"]
+)
+async def comments(
+        request: Request,
+        video_id: str,
+        page: Annotated[int, Query(ge=1)] = 1,
+        page_size: Annotated[int, Query(ge=1, le=100)] = 20,
+        x_secret: Annotated[str | None, Header()] = None
+) -> Response:
+    """Request handler"""
+    logger.info(f"Client {request.client.host} requested comments of video {video_id} with X-Secret {x_secret}")
+    await authorize(request, video_id, x_secret)
+
+    _comments = comments_cache.get(video_id)
+    if _comments is None:
+        # Outside the lazy comments mode the cached video information already holds the comments
+        info = video_cache.get(video_id)
+        _comments = info.get('comments') if info else None
+    if _comments is None:
+        _comments = await extract(comment_extractions, video_id, load_comments)
+
+    offset = (page - 1) * page_size
+    try:
+        return Response(
+            content=CommentsResponse(
+                id=video_id,
+                page=page,
+                page_size=page_size,
+                total=len(_comments),
+                comments=_comments[offset:offset + page_size]
+            ).model_dump_json(),
+            media_type="application/json"
+        )
+    except Exception as e:
+        logger.warning(f"Error fetch comments of video with ID:{video_id}. Error details: {e}")
+        raise HTTPException(status_code=500, detail="Internal application error")
@@ -0,0 +1,170 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Hashable
+
+
+def estimate_size(data: Any) -> int:
+    """
+    Roughly estimates the memory footprint of a JSON-like structure in bytes.
+
+    The estimate walks the structure iteratively and counts string and bytes
+    lengths plus a fixed overhead per node. It is meant for budgeting caches,
+    not for exact accounting.
+
+    Args:
+        data (Any): The structure to measure (dicts, lists, tuples and scalars).
+
+    Returns:
+        int: The estimated size in bytes.
+    """
+    size = 0
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        size += 16
+        if isinstance(item, (str, bytes)):
+            size += len(item)
+        elif isinstance(item, dict):
+            size += 32 * len(item)
+            for key, value in item.items():
+                size += len(key) if isinstance(key, str) else 8
+                stack.append(value)
+        elif isinstance(item, (list, tuple)):
+            size += 8 * len(item)
+            stack.extend(item)
+    return size
+
+
+class LRUCache:
+    """
+    Bounded in-process cache with least-recently-used eviction,
+    per-entry time-to-live and an optional byte budget.
+
+    The cache is not thread-safe and is meant to be used from the event loop.
+    """
+
+    def __init__(self, max_items: int, max_bytes: int = 0, ttl: float = 0) -> None:
+        """
+        Initializes the cache.
+
+        Args:
+            max_items (int): Maximum number of entries kept. 0 disables the cache.
+            max_bytes (int): Maximum total size of the entries in bytes. 0 means no byte budget.
+            ttl (float): Default time-to-live of an entry in seconds. 0 means entries never expire.
+        """
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._data: OrderedDict[Hashable, tuple[Any, float, int]] = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        # Membership checks neither refresh the entry nor count as a lookup
+        entry = self._data.get(key)
+        return entry is not None and not (entry[1] and entry[1] <= monotonic())
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the value stored for the key and marks it as recently used.
+
+        Args:
+            key (Hashable): The cache key.
+            default (Any): The value returned when the key is missing or expired.
+
+        Returns:
+            Any: The cached value, or the default.
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        value, expires_at, _ = entry
+        if expires_at and expires_at <= monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None, size: int = 0) -> None:
+        """
+        Stores a value, evicting the least recently used entries when the cache is over budget.
+
+        Args:
+            key (Hashable): The cache key.
+            value (Any): The value to store.
+            ttl (float | None): Time-to-live of the entry in seconds. Defaults to the cache TTL.
+            size (int): The size of the value in bytes, counted against the byte budget.
+        """
+        if self.max_items <= 0:
+            return
+        if self.max_bytes and size > self.max_bytes:
+            return
+
+        if key in self._data:
+            self._remove(key)
+
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (value, monotonic() + ttl if ttl > 0 else 0, size)
+        self._bytes += size
+
+        while len(self._data) > self.max_items or (self.max_bytes and self._bytes > self.max_bytes):
+            _, (_, _, _size) = self._data.popitem(last=False)
+            self._bytes -= _size
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Removes the key from the cache.
+
+        Args:
+            key (Hashable): The cache key.
+            default (Any): The value returned when the key is missing.
+
+        Returns:
+            Any: The removed value, or the default.
+        """
+        if key not in self._data:
+            return default
+        return self._remove(key)
+
+    def clear(self) -> None:
+        """Removes all entries from the cache."""
+        self._data.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: Entry count, byte usage, hits, misses, evictions, expirations and hit ratio.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remove(self, key: Hashable) -> Any:
+        value, _, size = self._data.pop(key)
+        self._bytes -= size
+        return value
@@ -1,21 +1,17 @@
-import requests
-
-from pydantic import field_validator
 from pydantic_settings import BaseSettings
 
 
-def fetch_cookies_data(url: str) -> str:
-    response = requests.get(url)
-    response.raise_for_status()  # Raise an exception for HTTP errors
-    return response.text
-
-
 class Settings(BaseSettings):
     ALLOWED_HOSTS: str = 'localhost,127.0.0.1,*.trycloudflare.com'
     CRYPT_KEY: str = 'fl5JcIwHh0SM87Vl18B_Sn65lVOwhYIQ3fnfGYqpVlE='
     CRYPT_TTL: int = 28800
+    TOKEN_CIPHER: str = 'aesgcm'
+    TOKEN_CACHE_SIZE: int = 4096
+    SIGN_CACHE_SIZE: int = 4096
     SECRET_KEY: str = 'devsecretkey'
     TURNSTILE_KEY: str = ''
+    TURNSTILE_VERIFY_URL: str = 'https://challenges.cloudflare.com/turnstile/v0/siteverify'
+    TURNSTILE_CACHE_SIZE: int = 4096
     DISABLE_TURNSTILE: int = 1
     DISABLE_DOCS: int = 0
     DISABLE_DEMO: int = 0
@@ -23,17 +19,55 @@ class Settings(BaseSettings):
     DISABLE_HOST_VALIDATION: int = 0
     COOKIES_URL: str = 'https://gist.githubusercontent.com/username/hex/raw/hex/file.txt'
     COOKIES: str = ''
+    COOKIES_FILE: str = ''
+    COOKIES_CACHE_PATH: str = '/tmp/ytdlp-fastapi-cookies.txt'
+    COOKIES_REFRESH_INTERVAL: int = 3600
     REST_MODE: int = 0
+    ENABLE_METRICS: int = 0
+    DISABLE_RATE_LIMIT: int = 1
+    RATE_LIMIT_BACKEND: str = 'memory'
+    RATE_LIMIT_SHM_PATH: str = '/dev/shm/ytdlp-fastapi-ratelimit'
+    RATE_LIMIT_SLOTS: int = 65536
+    RATE_LIMIT_VIDEO: str = '0.2/10'
+    RATE_LIMIT_VIDEO_GLOBAL: str = '5/50'
+    RATE_LIMIT_MANIFEST: str = '5/60'
+    RATE_LIMIT_MANIFEST_GLOBAL: str = ''
+    RATE_LIMIT_SEGMENT: str = '30/300'
+    RATE_LIMIT_SEGMENT_GLOBAL: str = ''
+    VIDEO_CACHE_SIZE: int = 256
+    VIDEO_CACHE_BYTES: int = 128 * 1024 * 1024
+    VIDEO_CACHE_TTL: int = 1800
+    LAZY_COMMENTS: int = 0
+    MAX_COMMENTS: int = 100
+    COMMENTS_CACHE_SIZE: int = 256
+    COMMENTS_CACHE_BYTES: int = 64 * 1024 * 1024
+    UPSTREAM_LIMIT: int = 256
+    UPSTREAM_LIMIT_PER_HOST: int = 32
+    UPSTREAM_DNS_TTL: int = 300
+    UPSTREAM_KEEPALIVE: int = 30
+    UPSTREAM_CONNECT_TIMEOUT: int = 10
+    UPSTREAM_READ_TIMEOUT: int = 30
+    STREAM_CHUNK_MIN: int = 16 * 1024
+    STREAM_CHUNK_MAX: int = 256 * 1024
+    HLS_CODECS: str = 'vp09'
+    MANIFEST_CACHE_SIZE: int = 512
+    MANIFEST_CACHE_BYTES: int = 64 * 1024 * 1024
+    MANIFEST_CACHE_TTL: int = 3600
+    SEGMENT_CACHE_DIR: str = ''
+    SEGMENT_CACHE_BYTES: int = 2 * 1024 * 1024 * 1024
+    SEGMENT_PREFETCH: int = 0
+    SEGMENT_PREFETCH_BYTES: int = 64 * 1024 * 1024
+    SEGMENT_PREFETCH_TTL: int = 60
+    SEGMENT_PREFETCH_INDEX_SIZE: int = 16384
+    EXTRACT_ENGINE: str = 'thread'
+    EXTRACT_WORKERS: int = 4
+    EXTRACT_QUEUE_SIZE: int = 16
+    EXTRACT_TIMEOUT: int = 60
+    EXTRACT_RETRY_AFTER: int = 5
+    PRELOAD_APP: int = 0
 
     class Config:
         env_file = "./.env.local"
 
-    @field_validator('COOKIES')
-    def load_cookies(cls, _, values):
-        url = values.data["COOKIES_URL"]
-        if url:
-            return fetch_cookies_data(url)
-        raise ValueError("COOKIES_URL must be provided")
-
 
 settings = Settings()
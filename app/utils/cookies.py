@@ -1,3 +1,17 @@
+import asyncio
+import os
+import random
+import time
+from typing import Optional
+
+from aiohttp import ClientError, ClientTimeout
+from fastapi.logger import logger
+
+from app.utils.config import settings
+from app.utils.http import upstream
+from app.utils.metrics import metrics
+
+
 class CookieConverter:
     """
     A class to convert Netscape format cookies to a cookie-list name-value string.
@@ -24,3 +38,232 @@ class CookieConverter:
             cookie_str += f"{name}={value}; "
 
         return cookie_str.rstrip("; ")
+
+
+class CookieProvider:
+    """
+    Provides the Cookie header sent to YouTube, loaded from the `COOKIES` setting,
+    a Netscape cookie file (`COOKIES_FILE`) or a URL (`COOKIES_URL`), in this order.
+
+    The header is converted once per change of the cookies and read as a plain attribute
+    by the extraction. Cookies fetched from the URL are written to a disk cache, so
+    workers starting after the first one load them from disk instead of fetching them;
+    the URL is then fetched again in the background when the cache is older than
+    `COOKIES_REFRESH_INTERVAL`. A cookie file is reread when it changes.
+    """
+
+    def __init__(self, cookies: str, cookies_file: str, cookies_url: str, cache_path: str,
+                 refresh_interval: int) -> None:
+        """
+        Initializes the provider.
+
+        :param cookies: Cookies in Netscape format, used as they are.
+        :param cookies_file: The path of a cookie file in Netscape format.
+        :param cookies_url: The URL of a cookie file in Netscape format.
+        :param cache_path: The disk cache of the cookies fetched from the URL. Empty disables it.
+        :param refresh_interval: The seconds between refreshes. 0 disables refreshing.
+        """
+        self.cookies = cookies
+        self.cookies_file = cookies_file
+        self.cookies_url = cookies_url
+        self.cache_path = cache_path
+        self.refresh_interval = refresh_interval
+
+        self.header = ""
+        # Incremented whenever the header changes
+        self.version = 0
+        self.source = ""
+        self.loaded_at = 0.0
+        self._mtime = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+        self.refreshes = 0
+        self.failures = 0
+
+    def _apply(self, netscape_cookie: str, source: str, loaded_at: float) -> bool:
+        """
+        Converts cookies to the header, keeping the version when they have not changed.
+
+        Malformed cookies are rejected and the previous header is kept.
+
+        :param netscape_cookie: A string containing cookies in Netscape format.
+        :param source: The source of the cookies, for the metrics.
+        :param loaded_at: The time the cookies were obtained at.
+        :return: True if the cookies were converted.
+        """
+        try:
+            header = CookieConverter(netscape_cookie).convert()
+        except ValueError as e:
+            self.failures += 1
+            logger.warning(f"Error converting cookies from {source}. Details: {e}")
+            return False
+        if header != self.header:
+            self.header = header
+            self.version += 1
+        self.source = source
+        self.loaded_at = loaded_at
+        return True
+
+    def _read_file(self, path: str, source: str) -> bool:
+        """
+        Loads cookies from a file if it has changed since the last read.
+
+        :param path: The path of the file.
+        :param source: The source of the cookies, for the metrics.
+        :return: True if the file exists and its cookies are valid.
+        """
+        try:
+            mtime = os.stat(path).st_mtime
+            if mtime == self._mtime:
+                return True
+            with open(path, encoding="utf-8") as file:
+                netscape_cookie = file.read()
+            # A malformed file is not read again until it changes
+            self._mtime = mtime
+            return self._apply(netscape_cookie, source, mtime)
+        except OSError as e:
+            logger.warning(f"Error reading cookies from {path}. Details: {e}")
+            return False
+
+    def _write_cache(self, netscape_cookie: str) -> None:
+        """
+        Writes cookies fetched from the URL to the disk cache, atomically for the other workers.
+
+        :param netscape_cookie: A string containing cookies in Netscape format.
+        """
+        if not self.cache_path:
+            return
+        temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                file.write(netscape_cookie)
+            os.replace(temp_path, self.cache_path)
+            self._mtime = os.stat(self.cache_path).st_mtime
+        except OSError as e:
+            logger.warning(f"Error writing the cookie cache. Details: {e}")
+
+    def _cache_fresh(self) -> bool:
+        """
+        Checks whether the disk cache was written within the refresh interval.
+
+        :return: True if the cache is fresh.
+        """
+        if not self.cache_path:
+            return False
+        try:
+            return os.stat(self.cache_path).st_mtime > time.time() - self.refresh_interval
+        except OSError:
+            return False
+
+    def load_local(self) -> None:
+        """Loads cookies from the setting, the cookie file or the disk cache, without network access."""
+        if self.cookies:
+            self._apply(self.cookies, "env", time.time())
+        elif self.cookies_file:
+            self._read_file(self.cookies_file, "file")
+        elif self.cookies_url and self.cache_path and os.path.exists(self.cache_path):
+            self._read_file(self.cache_path, "cache")
+
+    async def refresh(self) -> bool:
+        """
+        Reloads the cookies from the cookie file or the URL.
+
+        :return: True if the cookies were loaded.
+        """
+        if self.cookies:
+            return True
+        if self.cookies_file:
+            return self._read_file(self.cookies_file, "file")
+        if self._cache_fresh():
+            # Another worker has fetched the cookies in the meantime
+            return self._read_file(self.cache_path, "cache")
+
+        try:
+            timeout = ClientTimeout(total=settings.UPSTREAM_CONNECT_TIMEOUT + settings.UPSTREAM_READ_TIMEOUT)
+            async with upstream.session.get(self.cookies_url, timeout=timeout) as resp:
+                resp.raise_for_status()
+                netscape_cookie = await resp.text()
+        except (ClientError, asyncio.TimeoutError, OSError) as e:
+            self.failures += 1
+            logger.warning(f"Error fetching cookies from COOKIES_URL. Details: {e}")
+            return False
+
+        if not self._apply(netscape_cookie, "url", time.time()):
+            return False
+        self.refreshes += 1
+        self._write_cache(netscape_cookie)
+        return True
+
+    def _next_refresh(self) -> float:
+        """
+        Computes the delay until the next refresh.
+
+        :return: The delay in seconds.
+        """
+        if self.cookies_file:
+            return self.refresh_interval
+        # The jitter spreads the refreshes of the workers, so the first one fetches and the others read its cache
+        jitter = random.uniform(0, min(60.0, self.refresh_interval / 10))
+        return max(0.0, self.loaded_at + self.refresh_interval - time.time()) + jitter
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._next_refresh())
+            try:
+                refreshed = await self.refresh()
+            except Exception as e:
+                # The loop must survive any error, or the cookies would silently never refresh again
+                self.failures += 1
+                logger.warning(f"Error refreshing cookies. Details: {e}")
+                refreshed = False
+            if not refreshed:
+                # Retries failed fetches sooner, without hammering the source
+                await asyncio.sleep(min(self.refresh_interval, 60))
+
+    async def start(self) -> None:
+        """
+        Loads the cookies and starts the background refresh.
+
+        The URL is only fetched before the worker starts serving when there is
+        no cached copy yet; a stale cache is refreshed in the background.
+        """
+        self.load_local()
+        if not self.loaded_at and self.cookies_url and not (self.cookies or self.cookies_file):
+            await self.refresh()
+        if self.refresh_interval > 0 and not self.cookies and (self.cookies_file or self.cookies_url):
+            self._task = asyncio.ensure_future(self._refresh_loop())
+
+    async def stop(self) -> None:
+        """Stops the background refresh."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        """
+        Returns the provider state.
+
+        :return: The source, version and age of the cookies and the refresh counters.
+        """
+        return {
+            "source": self.source,
+            "version": self.version,
+            "age": round(time.time() - self.loaded_at) if self.loaded_at else None,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
+
+
+cookie_provider = CookieProvider(
+    cookies=settings.COOKIES,
+    cookies_file=settings.COOKIES_FILE,
+    cookies_url=settings.COOKIES_URL,
+    cache_path=settings.COOKIES_CACHE_PATH,
+    refresh_interval=settings.COOKIES_REFRESH_INTERVAL
+)
+metrics.register("cookies", cookie_provider.stats)
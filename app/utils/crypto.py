@@ -1,24 +1,184 @@
+import base64
+import binascii
+import ipaddress
 import json
+import os
+import struct
+from functools import lru_cache
 from time import time
 
-from cryptography.fernet import Fernet
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
 from app.utils.config import settings
 
+# First byte of the binary tokens; Fernet tokens always start with 0x80
+FERNET_VERSION = 0x80
+AEAD_VERSIONS = {
+    "aesgcm": 0x01,
+    "chacha20": 0x02,
+}
+
+# Version byte and big-endian UNIX timestamp, authenticated but not encrypted
+TOKEN_HEADER = struct.Struct(">BI")
+NONCE_SIZE = 12
+
+# Maximum accepted clock skew of token timestamps, as in Fernet
+MAX_CLOCK_SKEW = 60
+
+# Client host encodings inside the binary token payload
+HOST_IPV4 = 4
+HOST_IPV6 = 6
+HOST_TEXT = 0
+
+
+@lru_cache(maxsize=4)
+def aead_ciphers(crypt_key: str) -> dict:
+    """
+    Derives the AEAD ciphers from the Fernet key.
+
+    Args:
+        crypt_key (str): The Fernet key from `CRYPT_KEY`.
+
+    Returns:
+        dict: The cipher objects keyed by their token version byte.
+    """
+    key = HKDF(
+        algorithm=hashes.SHA256(), length=32, salt=None, info=b"ytdlp-fastapi token"
+    ).derive(base64.urlsafe_b64decode(crypt_key))
+    return {
+        AEAD_VERSIONS["aesgcm"]: AESGCM(key),
+        AEAD_VERSIONS["chacha20"]: ChaCha20Poly1305(key),
+    }
+
+
+def pack_host(client_host: str) -> bytes:
+    """
+    Encodes the client host compactly: packed bytes for IP addresses, UTF-8 text otherwise.
+
+    Args:
+        client_host (str): The client host.
+
+    Returns:
+        bytes: The encoded host.
+    """
+    try:
+        address = ipaddress.ip_address(client_host)
+    except ValueError:
+        text = client_host.encode()[:255]
+        return bytes((HOST_TEXT, len(text))) + text
+    return bytes((HOST_IPV4 if address.version == 4 else HOST_IPV6,)) + address.packed
+
+
+def unpack_host(payload: bytes) -> tuple[str, int]:
+    """
+    Decodes a client host encoded by `pack_host`.
+
+    Args:
+        payload (bytes): The token payload starting with the encoded host.
+
+    Returns:
+        tuple[str, int]: The client host and the length of its encoding.
+    """
+    kind = payload[0]
+    if kind == HOST_IPV4:
+        return str(ipaddress.IPv4Address(payload[1:5])), 5
+    if kind == HOST_IPV6:
+        return str(ipaddress.IPv6Address(payload[1:17])), 17
+    if kind == HOST_TEXT:
+        end = 2 + payload[1]
+        return payload[2:end].decode(), end
+    raise InvalidToken
+
+
+class TokenMinter:
+    """
+    Mints tokens for one client. The encoded client host, the timestamp
+    and the token header are computed once and shared by all tokens.
+    """
+
+    def __init__(self, cryptography: "Cryptography", client_host: str) -> None:
+        """
+        Initializes the minter.
+
+        Args:
+            cryptography (Cryptography): The Cryptography utility providing the keys.
+            client_host (str): The client host the tokens are bound to.
+        """
+        self.cryptography = cryptography
+        self.client_host = client_host
+        self.version = cryptography.version
+
+        if self.version != FERNET_VERSION:
+            self.cipher = cryptography.ciphers[self.version]
+            self.header = TOKEN_HEADER.pack(self.version, int(time()))
+            self.host = pack_host(client_host)
+
+    def mint(self, url: str) -> str:
+        """
+        Mints a token for a single URL.
+
+        Args:
+            url (str): The upstream URL.
+
+        Returns:
+            str: The token, URL-safe base64 without padding.
+        """
+        return self.mint_many([url])[0]
+
+    def mint_many(self, urls: list[str]) -> list[str]:
+        """
+        Mints tokens for a batch of URLs.
+
+        Args:
+            urls (list[str]): The upstream URLs.
+
+        Returns:
+            list[str]: The tokens in the same order.
+        """
+        if self.version == FERNET_VERSION:
+            return [
+                self.cryptography.encrypt_json({'url': url, 'client_host': self.client_host})
+                for url in urls
+            ]
+
+        nonces = os.urandom(NONCE_SIZE * len(urls))
+        tokens = []
+        for i, url in enumerate(urls):
+            nonce = nonces[i * NONCE_SIZE:(i + 1) * NONCE_SIZE]
+            sealed = self.cipher.encrypt(nonce, self.host + url.encode(), self.header)
+            tokens.append(
+                base64.urlsafe_b64encode(self.header + nonce + sealed).decode().rstrip("=")
+            )
+        return tokens
+
 
 class Cryptography:
     """
-    Provides encryption and decryption utilities using Fernet.
+    Provides encryption and decryption utilities using Fernet,
+    and the URL tokens of the proxy endpoints (Fernet or a faster AEAD cipher).
     """
 
     def __init__(self) -> None:
         """
         Initializes the Cryptography class.
 
-        Loads the encryption key from the environment variable `CRYPT_KEY`.
+        Loads the encryption key from the environment variable `CRYPT_KEY`
+        and the token cipher from `TOKEN_CIPHER`.
         """
         key: bytes = settings.CRYPT_KEY.encode()
         self.fernet = Fernet(key)
+        self.ciphers = aead_ciphers(settings.CRYPT_KEY)
+
+        if settings.TOKEN_CIPHER == "fernet":
+            self.version = FERNET_VERSION
+        elif settings.TOKEN_CIPHER in AEAD_VERSIONS:
+            self.version = AEAD_VERSIONS[settings.TOKEN_CIPHER]
+        else:
+            raise ValueError(f"Unknown token cipher: {settings.TOKEN_CIPHER}")
 
     def encrypt(self, _input: str) -> str:
         """
@@ -74,3 +234,62 @@ class Cryptography:
             The decrypted JSON data.
         """
         return json.loads(self.decrypt(_input))
+
+    def minter(self, client_host: str) -> TokenMinter:
+        """
+        Creates a token minter bound to a client.
+
+        Args:
+            client_host: The client host the tokens are bound to.
+
+        Returns:
+            The token minter.
+        """
+        return TokenMinter(self, client_host)
+
+    def decrypt_token(self, _input: str) -> dict:
+        """
+        Decrypts a URL token minted with any supported cipher.
+
+        Args:
+            _input: The token.
+
+        Returns:
+            The token data with the `url`, `client_host` and `timestamp` keys.
+
+        Raises:
+            InvalidToken: If the token is malformed, forged or expired.
+        """
+        padded = _input.encode() + b'=' * (-len(_input) % 4)
+        try:
+            raw = base64.urlsafe_b64decode(padded)
+        except (binascii.Error, ValueError):
+            raise InvalidToken
+
+        if not raw:
+            raise InvalidToken
+
+        if raw[0] == FERNET_VERSION:
+            data = self.decrypt_json(_input)
+            data['timestamp'] = self.fernet.extract_timestamp(padded)
+            return data
+
+        cipher = self.ciphers.get(raw[0])
+        if cipher is None or len(raw) < TOKEN_HEADER.size + NONCE_SIZE:
+            raise InvalidToken
+
+        header = raw[:TOKEN_HEADER.size]
+        _, timestamp = TOKEN_HEADER.unpack(header)
+        now = int(time())
+        if timestamp + settings.CRYPT_TTL < now or timestamp > now + MAX_CLOCK_SKEW:
+            raise InvalidToken
+
+        nonce = raw[TOKEN_HEADER.size:TOKEN_HEADER.size + NONCE_SIZE]
+        try:
+            payload = cipher.decrypt(nonce, raw[TOKEN_HEADER.size + NONCE_SIZE:], header)
+            client_host, offset = unpack_host(payload)
+            url = payload[offset:].decode()
+        except (InvalidTag, IndexError, ValueError):
+            raise InvalidToken
+
+        return {'url': url, 'client_host': client_host, 'timestamp': timestamp}
@@ -1,4 +1,8 @@
 import re
+from typing import Optional
+
+# Matches both query-style (?expire=...) and path-style (/expire/.../) parameters of googlevideo URLs
+EXPIRE_PATTERN = re.compile(r'[?&/]expire[=/](\d+)')
 
 
 class DLPUtils:
@@ -41,3 +45,26 @@ class DLPUtils:
         """
         pattern = re.compile(r'^[a-zA-Z0-9_-]{11}$')
         return bool(pattern.match(video_id))
+
+    @staticmethod
+    def get_expire(info: dict) -> Optional[int]:
+        """
+        Finds the earliest expiration timestamp of the signed googlevideo URLs in an info dict.
+
+        Parameters:
+        info (dict): The info dict returned by yt_dlp.
+
+        Returns:
+        Optional[int]: The earliest `expire` UNIX timestamp, or None if no URL carries one.
+        """
+        urls = [info.get('manifest_url')]
+        for _format in info.get('formats') or []:
+            urls.append(_format.get('url'))
+            urls.append(_format.get('manifest_url'))
+
+        expires = [
+            int(match.group(1)) for match in (
+                EXPIRE_PATTERN.search(url) for url in urls if url
+            ) if match
+        ]
+        return min(expires) if expires else None
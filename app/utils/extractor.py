@@ -0,0 +1,401 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional
+
+from fastapi.logger import logger
+
+from app.utils.config import settings
+
+if TYPE_CHECKING:
+    import yt_dlp
+
+# yt_dlp options of the video information extraction without comments
+CORE_OPTIONS = {
+    'no_warnings': True,
+    'noprogress': True,
+    'quiet': True,
+}
+
+# yt_dlp options of the video information extraction with comments
+FULL_OPTIONS = {
+    **CORE_OPTIONS,
+    'getcomments': True,
+    'extractor_args': {
+        'youtube': {
+            'comment_sort': ['top'],
+            'max_comments': [str(settings.MAX_COMMENTS), 'all', '0', '0'],
+        }
+    },
+}
+
+# Options of /v1/video; in the lazy comments mode comments are only extracted by /v1/video/{video_id}/comments
+INFO_OPTIONS = CORE_OPTIONS if bool(settings.LAZY_COMMENTS) else FULL_OPTIONS
+
+
+def load_yt_dlp() -> tuple[type, type]:
+    """
+    Imports yt_dlp and its YouTube extractor.
+
+    yt_dlp is imported on first use rather than with this module, so a worker
+    is ready to serve before it is loaded; the first extractions (or the warm-up
+    in the lifespan) load it on the extraction threads.
+
+    Returns:
+        tuple[type, type]: The YoutubeDL and YoutubeIE classes.
+    """
+    from yt_dlp import YoutubeDL
+    from yt_dlp.extractor.youtube import YoutubeIE
+
+    return YoutubeDL, YoutubeIE
+
+
+class ExtractorOverloaded(Exception):
+    """
+    Raised when the extraction queue is full and the request is rejected.
+    """
+
+
+class YoutubeDLPool:
+    """
+    Keeps long-lived YoutubeDL instances between extractions.
+
+    Reusing an instance keeps its initialized extractors and their caches
+    (player JS, signature functions) instead of rebuilding them per request.
+    Instances are checked out exclusively, as YoutubeDL is not thread-safe,
+    and are replaced when the options or the cookie header change.
+    """
+
+    def __init__(self, max_idle: int) -> None:
+        """
+        Initializes the pool.
+
+        Args:
+            max_idle (int): The maximum number of idle instances kept.
+        """
+        self.max_idle = max_idle
+        self._idle: list[tuple[str, str, 'yt_dlp.YoutubeDL']] = []
+        self._lock = threading.Lock()
+
+        self.created = 0
+        self.reused = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def _options_key(options: Dict[str, Any]) -> str:
+        return json.dumps(options, sort_keys=True)
+
+    def create(self, options: Dict[str, Any], cookie_header: str) -> 'yt_dlp.YoutubeDL':
+        """
+        Creates a new instance with the YouTube extractor initialized.
+
+        Args:
+            options (Dict[str, Any]): The yt_dlp options.
+            cookie_header (str): The Cookie header sent to YouTube.
+
+        Returns:
+            yt_dlp.YoutubeDL: The instance.
+        """
+        YoutubeDL, YoutubeIE = load_yt_dlp()
+        # Only the YouTube extractor is registered instead of the hundreds of default ones;
+        # results it hands off to another extractor are retried by extract_info with all of them
+        ydl = YoutubeDL({**options, 'http_headers': {"Cookie": cookie_header}}, auto_init=False)
+        # Instantiate the YouTube extractor up front so its caches live as long as the instance
+        ydl.add_info_extractor(YoutubeIE())
+        self.created += 1
+        return ydl
+
+    def _release(self, entries: list[tuple[str, str, 'yt_dlp.YoutubeDL']]) -> None:
+        for _, _, ydl in entries:
+            ydl.close()
+
+    def idle_count(self, options: Dict[str, Any], cookie_header: str) -> int:
+        """
+        Counts the idle instances matching the options and cookie header.
+
+        Args:
+            options (Dict[str, Any]): The yt_dlp options.
+            cookie_header (str): The Cookie header sent to YouTube.
+
+        Returns:
+            int: The number of matching idle instances.
+        """
+        key = self._options_key(options)
+        with self._lock:
+            return sum(1 for _key, _cookie, _ in self._idle if _key == key and _cookie == cookie_header)
+
+    def put(self, options: Dict[str, Any], cookie_header: str, ydl: 'yt_dlp.YoutubeDL') -> None:
+        """
+        Returns an instance to the idle list, closing the oldest ones above the limit.
+
+        Args:
+            options (Dict[str, Any]): The yt_dlp options the instance was created with.
+            cookie_header (str): The Cookie header the instance was created with.
+            ydl (yt_dlp.YoutubeDL): The instance.
+        """
+        with self._lock:
+            self._idle.append((self._options_key(options), cookie_header, ydl))
+            stale = self._idle[:-self.max_idle] if len(self._idle) > self.max_idle else []
+            del self._idle[:len(stale)]
+        self._release(stale)
+
+    @contextmanager
+    def checkout(self, options: Dict[str, Any], cookie_header: str) -> Iterator['yt_dlp.YoutubeDL']:
+        """
+        Checks out an instance for exclusive use, creating one if none is idle.
+
+        Idle instances created with a different cookie header are closed.
+
+        Args:
+            options (Dict[str, Any]): The yt_dlp options.
+            cookie_header (str): The Cookie header sent to YouTube.
+
+        Yields:
+            yt_dlp.YoutubeDL: The instance.
+        """
+        key = self._options_key(options)
+        ydl = None
+        with self._lock:
+            stale = [entry for entry in self._idle if entry[1] != cookie_header]
+            self._idle = [entry for entry in self._idle if entry[1] == cookie_header]
+            for i, (_key, _, _ydl) in enumerate(self._idle):
+                if _key == key:
+                    ydl = self._idle.pop(i)[2]
+                    self.reused += 1
+                    break
+        self._release(stale)
+
+        if ydl is None:
+            ydl = self.create(options, cookie_header)
+
+        try:
+            yield ydl
+        finally:
+            self.put(options, cookie_header, ydl)
+
+    def close(self) -> None:
+        """Closes all idle instances."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        self._release(idle)
+
+    def stats(self) -> dict:
+        """
+        Returns the pool counters.
+
+        Returns:
+            dict: Idle, created and reused instance counts and the fallbacks to the default extractors.
+        """
+        return {
+            "idle": len(self._idle),
+            "created": self.created,
+            "reused": self.reused,
+            "fallbacks": self.fallbacks,
+        }
+
+
+# Instances of the current process; every extraction process of the "process" engine has its own
+ydl_pool = YoutubeDLPool(max_idle=settings.EXTRACT_WORKERS * 2)
+
+
+def extract_info(video_url: str, options: Dict[str, Any], cookie_header: str) -> Dict[str, Any]:
+    """
+    Extracts information from a YouTube video URL using a pooled yt_dlp instance.
+
+    Runs inside the extraction workers, so the result is sanitized
+    into plain data that can be pickled and cached. If the YouTube extractor
+    hands the result off to an extractor the pooled instances do not register
+    (a `url` or `url_transparent` result), the extraction is retried on a
+    one-off instance with the default extractors.
+
+    Args:
+        video_url (str): The URL of the YouTube video.
+        options (Dict[str, Any]): The yt_dlp options.
+        cookie_header (str): The Cookie header sent to YouTube.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing the extracted video information.
+    """
+    from yt_dlp.utils import DownloadError
+
+    with ydl_pool.checkout(options, cookie_header) as ydl:
+        try:
+            return ydl.sanitize_info(ydl.extract_info(video_url, download=False))
+        except DownloadError as e:
+            if "No suitable extractor" not in str(e):
+                raise
+
+    ydl_pool.fallbacks += 1
+    logger.warning(f"Retrying extraction of {video_url} with the default extractors")
+    YoutubeDL, _ = load_yt_dlp()
+    with YoutubeDL({**options, 'http_headers': {"Cookie": cookie_header}}) as ydl:
+        return ydl.sanitize_info(ydl.extract_info(video_url, download=False))
+
+
+def prewarm(options: Dict[str, Any], cookie_header: str, target: int) -> None:
+    """
+    Creates an idle yt_dlp instance unless the worker already has enough of them.
+
+    Args:
+        options (Dict[str, Any]): The yt_dlp options.
+        cookie_header (str): The Cookie header sent to YouTube.
+        target (int): The number of idle instances the worker should keep.
+    """
+    if ydl_pool.idle_count(options, cookie_header) < target:
+        ydl_pool.put(options, cookie_header, ydl_pool.create(options, cookie_header))
+
+
+class ExtractionPool:
+    """
+    Runs yt_dlp extractions on a dedicated thread or process pool.
+
+    At most `workers` extractions run at once and at most `queue_size` requests
+    wait for a free worker; further requests are rejected with `ExtractorOverloaded`.
+    """
+
+    ENGINES = {
+        "thread": ThreadPoolExecutor,
+        "process": ProcessPoolExecutor,
+    }
+
+    def __init__(self, engine: str, workers: int, queue_size: int, timeout: float) -> None:
+        """
+        Initializes the pool. The executor itself is created on first use.
+
+        Args:
+            engine (str): The executor type, "thread" or "process".
+            workers (int): The maximum number of concurrent extractions.
+            queue_size (int): The maximum number of requests waiting for a worker.
+            timeout (float): The maximum time in seconds a request waits for its result.
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown extraction engine: {engine}")
+
+        self.engine = engine
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+
+        self._executor: Optional[Executor] = None
+        self._semaphore = asyncio.Semaphore(workers)
+        self._waiting = 0
+        self._busy = 0
+
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = self.ENGINES[self.engine](max_workers=self.workers)
+        return self._executor
+
+    def warm_up(self, options: Dict[str, Any], cookie_header: str) -> None:
+        """
+        Schedules the creation of idle yt_dlp instances on the workers without waiting for it.
+
+        Args:
+            options (Dict[str, Any]): The yt_dlp options.
+            cookie_header (str): The Cookie header sent to YouTube.
+        """
+        # Threads share one instance list, every process keeps its own
+        target = self.workers if self.engine == "thread" else 1
+        for _ in range(self.workers):
+            future = self.executor.submit(prewarm, options, cookie_header, target)
+            future.add_done_callback(self._on_warm_up_done)
+
+    @staticmethod
+    def _on_warm_up_done(future) -> None:
+        if not future.cancelled() and future.exception():
+            logger.warning(f"Error warming up yt_dlp instance. Details: {future.exception()}")
+
+    async def run(self, video_url: str, options: Dict[str, Any], cookie_header: str) -> Dict[str, Any]:
+        """
+        Extracts the video information on the pool.
+
+        Args:
+            video_url (str): The URL of the YouTube video.
+            options (Dict[str, Any]): The yt_dlp options.
+            cookie_header (str): The Cookie header sent to YouTube.
+
+        Returns:
+            Dict[str, Any]: A dictionary containing the extracted video information.
+
+        Raises:
+            ExtractorOverloaded: If the wait queue is full.
+            asyncio.TimeoutError: If the extraction did not finish in time.
+        """
+        if self._busy + self._waiting >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise ExtractorOverloaded()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self._waiting -= 1
+
+        try:
+            future = loop.run_in_executor(self.executor, extract_info, video_url, options, cookie_header)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        self._busy += 1
+        # The worker slot is held until the extraction really finishes, even if the request gave up on it
+        future.add_done_callback(self._on_done)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def _on_done(self, future: asyncio.Future) -> None:
+        self._busy -= 1
+        self._semaphore.release()
+        self.completed += 1
+        if not future.cancelled():
+            # Mark the exception as retrieved when the requester has already timed out
+            future.exception()
+
+    def shutdown(self) -> None:
+        """Shuts the executor down without waiting for running extractions."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        ydl_pool.close()
+
+    def stats(self) -> dict:
+        """
+        Returns the pool counters.
+
+        Returns:
+            dict: Engine, worker and queue limits, busy workers, waiting requests and outcome counters.
+        """
+        return {
+            "engine": self.engine,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "busy": self._busy,
+            "waiting": self._waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+extraction_pool = ExtractionPool(
+    engine=settings.EXTRACT_ENGINE,
+    workers=settings.EXTRACT_WORKERS,
+    queue_size=settings.EXTRACT_QUEUE_SIZE,
+    timeout=settings.EXTRACT_TIMEOUT
+)
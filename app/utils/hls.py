@@ -1,107 +1,293 @@
-import m3u8
+import codecs
+import re
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, Iterable, Optional, Union
+
 from fastapi import Request
 
 from app.utils.config import settings
 from app.utils.crypto import Cryptography
+from app.utils.prefetch import prefetcher
+
+# Tags whose URI="..." attribute points to a resource served through the proxy
+URI_ATTRIBUTE_TAGS = ("#EXT-X-KEY:", "#EXT-X-MAP:", "#EXT-X-MEDIA:")
+URI_ATTRIBUTE_PATTERN = re.compile(r'URI="([^"]*)"')
+
+VARIANT_TAG = "#EXT-X-STREAM-INF:"
+# Codec prefixes of the variants kept in master playlists; empty keeps every variant
+VARIANT_CODECS = tuple(codec.strip() for codec in settings.HLS_CODECS.split(",") if codec.strip())
+ATTRIBUTE_PATTERN = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+def parse_attributes(attributes: str) -> dict[str, str]:
+    """
+    Parses the attribute list of an HLS tag.
+
+    Args:
+        attributes (str): The part of the tag line after the colon.
+
+    Returns:
+        dict[str, str]: The attribute values keyed by name, with quotes removed.
+    """
+    return {name: value.strip('"') for name, value in ATTRIBUTE_PATTERN.findall(attributes)}
+
+
+def split_lines(text: str) -> list[str]:
+    """
+    Splits manifest text into lines, keeping the line endings.
+
+    Args:
+        text (str): The manifest text.
+
+    Returns:
+        list[str]: The lines; only the last one may lack a line ending.
+    """
+    lines = text.split("\n")
+    last = lines.pop()
+    result = [f"{line}\n" for line in lines]
+    if last:
+        result.append(last)
+    return result
+
+
+@dataclass
+class Variant:
+    """A variant stream of a master playlist: its EXT-X-STREAM-INF line and the URI line following it."""
+    tag: str
+    resolution: str
+    bandwidth: int
+    uri: Optional[str] = None
+    ending: str = ""
+    keep: bool = False
+
+
+def codec_allowed(codecs: str, allowed: tuple[str, ...]) -> bool:
+    """
+    Checks a variant against the codec policy.
+
+    Args:
+        codecs (str): The CODECS attribute of the variant.
+        allowed (tuple[str, ...]): The allowed codec prefixes. Empty allows every codec.
+
+    Returns:
+        bool: True if one of the codecs of the variant starts with an allowed prefix.
+    """
+    if not allowed:
+        return True
+    return any(codec.strip().startswith(allowed) for codec in codecs.split(","))
 
 
 class HLSReplacer:
     """
     This class provides functionality to replace HLS manifest URLs with encrypted URLs
     that point to local endpoints, enhancing security and controlling access.
+
+    Manifests are rewritten line by line in a single pass: only URI lines and the URI
+    attributes of EXT-X-KEY, EXT-X-MAP and EXT-X-MEDIA are changed, every other line is
+    passed through as is. The input can be fed in pieces, so media playlists are produced
+    while the upstream body is still being received.
+
+    Master playlists are held until complete: of the variants matching `HLS_CODECS`,
+    the one with the highest bandwidth per resolution is kept, and tokens are minted
+    only for the kept ones.
     """
 
-    @staticmethod
-    def replace_manifest_links(manifest_content: str, request: Request) -> str:
+    def __init__(self, request: Request) -> None:
         """
-        Replaces the URLs in an HLS playlist manifest with encrypted local URLs.
+        Initializes the replacer for one manifest and resolves the client host.
 
         Args:
-            manifest_content (str): The original HLS manifest content as a string.
             request (Request): The FastAPI request object.
-
-        Returns:
-            str: The updated HLS manifest content with replaced URLs.
         """
-        playlist = m3u8.loads(manifest_content)  # Parse the manifest content
-        cryptography = Cryptography()  # Initialize the Cryptography utility
-
         # Determine the client host for encryption
         client_host = request.client.host
         x_host = request.headers.get("X-Client-Host")
         if settings.REST_MODE and x_host:
             client_host = x_host
 
-        def replace_url(url: str) -> str:
-            """
-            Constructs and returns a new encrypted URL for a given HLS segment or playlist.
-
-            Args:
-                url (str): The original URL to be replaced.
-
-            Returns:
-                str: The new encrypted URL.
-            """
-            _host = f"{request.url.scheme}://{request.url.netloc}"
-            _data = cryptography.encrypt_json({
-                'url': url,
-                'client_host': client_host
-            })
-
-            # Determine the new URL based on the type (playlist or segment)
-            if 'hls_playlist' in url:
-                new_url = f"{_host}/v1/manifest/hls/{_data}.m3u8"
+        # All tokens of the manifest share the client host and the timestamp
+        self.minter = Cryptography().minter(client_host)
+        self.base_url = f"{request.url.scheme}://{request.url.netloc}"
+
+        # Tokens of attribute URIs; keys and maps repeat throughout media playlists
+        self._attribute_tokens: dict[str, str] = {}
+        # Output pieces not rendered yet; URIs are kept as (uri, before, after) until their tokens are minted
+        self._pieces: list[Union[str, tuple[str, str, str], Variant]] = []
+        # The variant whose URI line comes next; rejected variants are tracked to drop their URI line
+        self._variant: Optional[Variant] = None
+        self._variants: list[Variant] = []
+        self._segment_urls: list[str] = []
+
+    def local_url(self, url: str, token: str) -> str:
+        """
+        Constructs the local URL of a given HLS segment or playlist from its token.
+
+        Args:
+            url (str): The original URL to be replaced.
+            token (str): The token minted for the original URL.
+
+        Returns:
+            str: The new encrypted URL.
+        """
+        # Determine the new URL based on the type (playlist or segment)
+        if 'hls_playlist' in url:
+            return f"{self.base_url}/v1/manifest/hls/{token}.m3u8"
+        return f"{self.base_url}/v1/manifest/segment/{token}.ts"
+
+    def _open_variant(self, tag: str, content: str) -> None:
+        """
+        Starts a variant stream at its EXT-X-STREAM-INF line.
+
+        Args:
+            tag (str): The tag line including its line ending.
+            content (str): The tag line without its line ending.
+        """
+        attributes = parse_attributes(content[len(VARIANT_TAG):])
+        bandwidth = attributes.get("BANDWIDTH", "")
+        self._variant = Variant(
+            tag=tag,
+            resolution=attributes.get("RESOLUTION", ""),
+            bandwidth=int(bandwidth) if bandwidth.isdigit() else 0,
+        )
+        if codec_allowed(attributes.get("CODECS", ""), VARIANT_CODECS):
+            self._variants.append(self._variant)
+            self._pieces.append(self._variant)
+
+    def _select_variants(self) -> None:
+        """Keeps the variant with the highest bandwidth of every resolution, the first one on ties."""
+        best: dict[str, Variant] = {}
+        for variant in self._variants:
+            if variant.uri is None:
+                continue
+            current = best.get(variant.resolution)
+            if current is None or variant.bandwidth > current.bandwidth:
+                best[variant.resolution] = variant
+        for variant in best.values():
+            variant.keep = True
+
+    def feed(self, lines: Iterable[str]) -> str:
+        """
+        Rewrites complete manifest lines.
+
+        Args:
+            lines (Iterable[str]): The lines including their line endings.
+
+        Returns:
+            str: The rewritten lines, or an empty string while a master playlist is held.
+        """
+        pieces = self._pieces
+        for line in lines:
+            content = line.rstrip("\r\n")
+            ending = line[len(content):]
+
+            if not content or content[0] == "#":
+                if content.startswith(VARIANT_TAG):
+                    self._open_variant(line, content)
+                elif content.startswith(URI_ATTRIBUTE_TAGS):
+                    match = URI_ATTRIBUTE_PATTERN.search(content)
+                    if match:
+                        pieces.append((match.group(1), content[:match.start(1)], content[match.end(1):] + ending))
+                    else:
+                        pieces.append(line)
+                else:
+                    pieces.append(line)
+                continue
+
+            uri = content.strip()
+            if self._variant is None:
+                self._segment_urls.append(uri)
+                pieces.append((uri, "", ending))
             else:
-                new_url = f"{_host}/v1/manifest/segment/{_data}.ts"
-
-            return new_url
-
-        # Replace URLs in segments and associated keys
-        if playlist.segments:
-            for segment in playlist.segments:
-                segment.uri = replace_url(segment.uri)  # Replace segment URL
-
-                # Replace key URL if present
-                if segment.key and segment.key.uri:
-                    segment.key.uri = replace_url(segment.key.uri)
-
-                # Replace initialization section URL if present
-                if segment.init_section and segment.init_section.uri:
-                    segment.init_section.uri = replace_url(segment.init_section.uri)
-
-        # Replace URLs in media segments
-        if playlist.media:
-            for media in playlist.media:
-                media.uri = replace_url(media.uri)
-
-        # Optimize and replace URLs in resolution groups
-        resolution_groups = {}
-        i = 0
-        while i < len(playlist.playlists):
-            p = playlist.playlists[i]
-
-            # Filter out non-MP4 (e.g., VP9) streams
-            if 'vp09' not in p.stream_info.codecs:
-                del playlist.playlists[i]
-                continue  # Skip incrementing i to check the next item at the same index
-
-            resolution = p.stream_info.resolution
-            if resolution not in resolution_groups:
-                # Add a new resolution group if it doesn't exist
-                resolution_groups[resolution] = p
-                p.uri = replace_url(p.uri)
-                i += 1
+                self._variant.uri = uri
+                self._variant.ending = ending
+                self._variant = None
+
+        if self._variants:
+            return ""
+        return self._render()
+
+    def finish(self) -> str:
+        """
+        Finishes the manifest, handing its segment order to the prefetcher.
+
+        Returns:
+            str: The rest of the rewritten manifest.
+        """
+        if prefetcher.enabled and self._segment_urls:
+            prefetcher.record(self._segment_urls)
+        self._select_variants()
+        return self._render()
+
+    def _render(self) -> str:
+        """
+        Renders the pending output pieces, minting the tokens of all their URIs at once.
+
+        Returns:
+            str: The rendered output.
+        """
+        pieces, self._pieces = self._pieces, []
+        uris = []
+        for piece in pieces:
+            if isinstance(piece, tuple):
+                if piece[0] not in self._attribute_tokens:
+                    uris.append(piece[0])
+            elif isinstance(piece, Variant) and piece.keep:
+                uris.append(piece.uri)
+        uris = list(dict.fromkeys(uris))
+        tokens = dict(zip(uris, self.minter.mint_many(uris)))
+        tokens.update(self._attribute_tokens)
+
+        output = []
+        for piece in pieces:
+            if isinstance(piece, str):
+                output.append(piece)
+            elif isinstance(piece, Variant):
+                if piece.keep:
+                    output.append(f"{piece.tag}{self.local_url(piece.uri, tokens[piece.uri])}{piece.ending}")
             else:
-                existing_playlist = resolution_groups[resolution]
-                if p.stream_info.bandwidth > existing_playlist.stream_info.bandwidth:
-                    # Replace the existing playlist with a higher bandwidth one
-                    resolution_groups[resolution] = p
-                    p.uri = replace_url(p.uri)
-                    del playlist.playlists[i]
-                else:
-                    # Remove the current playlist if a better one already exists
-                    del playlist.playlists[i]
+                uri, before, after = piece
+                if before:
+                    self._attribute_tokens[uri] = tokens[uri]
+                output.append(f"{before}{self.local_url(uri, tokens[uri])}{after}")
+        return "".join(output)
+
+    async def stream(self, chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+        """
+        Rewrites a manifest while it is received.
+
+        Args:
+            chunks (AsyncIterable[bytes]): The UTF-8 encoded manifest body.
+
+        Yields:
+            str: The rewritten manifest, one batch of complete lines at a time.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        tail = ""
+        async for chunk in chunks:
+            text = tail + decoder.decode(chunk)
+            end = text.rfind("\n") + 1
+            tail = text[end:]
+            output = self.feed(split_lines(text[:end])) if end else ""
+            if output:
+                yield output
+
+        tail += decoder.decode(b"", final=True)
+        output = self.feed([tail]) if tail else ""
+        output += self.finish()
+        if output:
+            yield output
+
+    @staticmethod
+    def replace_manifest_links(manifest_content: str, request: Request) -> str:
+        """
+        Replaces the URLs in an HLS playlist manifest with encrypted local URLs.
 
-        # Return the updated manifest content as a string
-        updated_manifest = playlist.dumps()
-        return updated_manifest
+        Args:
+            manifest_content (str): The original HLS manifest content as a string.
+            request (Request): The FastAPI request object.
+
+        Returns:
+            str: The updated HLS manifest content with replaced URLs.
+        """
+        replacer = HLSReplacer(request)
+        return replacer.feed(split_lines(manifest_content)) + replacer.finish()
@@ -0,0 +1,129 @@
+from typing import Optional
+
+from app.utils.config import settings
+
+# Key marking the end of a `*.` wildcard pattern in the suffix trie; labels are always strings
+WILDCARD_END = None
+
+
+class HostMatcher:
+    """
+    Matches hosts against the allowed host patterns (`ALLOWED_HOSTS`).
+
+    Exact patterns are kept in a set, `*.` wildcard patterns in a trie of their labels
+    in reverse order, so a lookup costs one set lookup plus one step per label
+    of the host, whatever the number of patterns.
+    """
+
+    def __init__(self, patterns: str) -> None:
+        """
+        Builds the matcher.
+
+        Args:
+            patterns (str): The comma-separated host patterns, as in `ALLOWED_HOSTS`.
+        """
+        self.patterns = patterns
+        self.allow_any = False
+        self.exact: set[str] = set()
+        self.suffixes: dict = {}
+
+        for pattern in patterns.split(","):
+            pattern = pattern.strip()
+            if pattern == "*":
+                self.allow_any = True
+            elif pattern.startswith("*."):
+                node = self.suffixes
+                for label in reversed(pattern[2:].split(".")):
+                    node = node.setdefault(label, {})
+                node[WILDCARD_END] = True
+            elif pattern:
+                self.exact.add(pattern)
+
+    def _wildcard_depths(self, host: str) -> list[int]:
+        """
+        Finds the wildcard domains the host belongs to.
+
+        Args:
+            host (str): The host without port.
+
+        Returns:
+            list[int]: For every matching wildcard domain, the number of host labels left of it.
+        """
+        labels = host.split(".")
+        node = self.suffixes
+        depths = []
+        for i in range(len(labels) - 1, -1, -1):
+            node = node.get(labels[i])
+            if node is None:
+                break
+            if WILDCARD_END in node:
+                depths.append(i)
+        return depths
+
+    def match_referer(self, netloc: str) -> bool:
+        """
+        Validates the host of a Referer or Origin header.
+
+        A `*.example.com` pattern matches example.com and all of its subdomains,
+        and every pattern accepts an optional port.
+
+        Args:
+            netloc (str): The network location of the referer or origin URL.
+
+        Returns:
+            bool: True if the host is allowed.
+        """
+        host, separator, port = netloc.rpartition(":")
+        candidates = (netloc, host) if separator and port.isdecimal() else (netloc,)
+        for candidate in candidates:
+            if candidate in self.exact:
+                return True
+            # The wildcard domain itself has depth 0; subdomains need a non-empty prefix before the dot
+            for depth in self._wildcard_depths(candidate):
+                if depth != 1 or not candidate.startswith("."):
+                    return True
+        return False
+
+    def match_host(self, host: str) -> bool:
+        """
+        Validates the host of a Host header, with the semantics of Starlette's TrustedHostMiddleware.
+
+        A `*.example.com` pattern only matches subdomains and `*` matches every host.
+
+        Args:
+            host (str): The host without port.
+
+        Returns:
+            bool: True if the host is allowed.
+        """
+        if self.allow_any or host in self.exact:
+            return True
+        return any(depth > 0 for depth in self._wildcard_depths(host))
+
+    def www_redirect(self, host: str) -> bool:
+        """
+        Checks whether the www. variant of a rejected host is allowed.
+
+        Args:
+            host (str): The host without port.
+
+        Returns:
+            bool: True if the client should be redirected to the www. host.
+        """
+        return f"www.{host}" in self.exact
+
+
+_matcher: Optional[HostMatcher] = None
+
+
+def host_matcher() -> HostMatcher:
+    """
+    Returns the matcher of the current `ALLOWED_HOSTS`, rebuilding it when the setting has changed.
+
+    Returns:
+        HostMatcher: The shared matcher.
+    """
+    global _matcher
+    if _matcher is None or _matcher.patterns != settings.ALLOWED_HOSTS:
+        _matcher = HostMatcher(settings.ALLOWED_HOSTS)
+    return _matcher
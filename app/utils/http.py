@@ -0,0 +1,86 @@
+from typing import AsyncIterator, Optional
+
+from aiohttp import ClientSession, ClientTimeout, StreamReader, TCPConnector
+
+from app.utils.config import settings
+
+
+class UpstreamClient:
+    """
+    Holds the aiohttp session shared by all upstream requests of the worker
+    (googlevideo, manifest.googlevideo.com, Cloudflare Turnstile).
+
+    Connections are pooled and kept alive between requests and DNS results are cached,
+    so the handshakes are not paid on every request.
+    """
+
+    def __init__(self) -> None:
+        self._session: Optional[ClientSession] = None
+
+    @property
+    def session(self) -> ClientSession:
+        """
+        Returns the shared session, creating it on first use.
+
+        Must be accessed from the event loop.
+
+        Returns:
+            ClientSession: The shared session.
+        """
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=TCPConnector(
+                    limit=settings.UPSTREAM_LIMIT,
+                    limit_per_host=settings.UPSTREAM_LIMIT_PER_HOST,
+                    ttl_dns_cache=settings.UPSTREAM_DNS_TTL,
+                    keepalive_timeout=settings.UPSTREAM_KEEPALIVE,
+                ),
+                timeout=ClientTimeout(
+                    total=None,
+                    connect=settings.UPSTREAM_CONNECT_TIMEOUT,
+                    sock_read=settings.UPSTREAM_READ_TIMEOUT,
+                ),
+                # Lets the response buffer hold a full chunk before reading from the socket is paused
+                read_bufsize=settings.STREAM_CHUNK_MAX,
+            )
+        return self._session
+
+    async def start(self) -> None:
+        """Creates the shared session."""
+        _ = self.session
+
+    async def close(self) -> None:
+        """Closes the shared session and its pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+async def iter_adaptive(content: StreamReader, min_size: int, max_size: int) -> AsyncIterator[bytes]:
+    """
+    Yields the body of an upstream response as soon as data is available.
+
+    Reads start at `min_size` for a fast first byte and double up to `max_size`
+    while the upstream keeps the buffer full, so fast transfers use few large writes.
+    The next read only happens after the consumer has taken the previous chunk,
+    so a slow client pauses the upstream instead of making the worker buffer.
+
+    Args:
+        content (StreamReader): The body stream of the upstream response.
+        min_size (int): The initial chunk size in bytes.
+        max_size (int): The maximum chunk size in bytes.
+
+    Yields:
+        bytes: The chunks of the body.
+    """
+    size = min_size
+    while True:
+        chunk = await content.read(size)
+        if not chunk:
+            break
+        yield chunk
+        if len(chunk) == size and size < max_size:
+            size = min(size * 2, max_size)
+
+
+upstream = UpstreamClient()
@@ -0,0 +1,141 @@
+"""
+Startup report of a worker: where the import time of the application goes.
+
+Usage: python -m app.utils.importtime [--module app.main] [--top 15]
+
+The module is imported in a fresh interpreter with `-X importtime`, so the
+report reflects a cold worker start, and the time until the lifespan startup
+has completed is measured in a second one.
+"""
+
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+from typing import NamedTuple
+
+READY_SCRIPT = """
+import asyncio, importlib, sys, time
+start = time.perf_counter()
+module = importlib.import_module(sys.argv[1])
+imported = time.perf_counter()
+
+async def main():
+    async with module.app.router.lifespan_context(module.app):
+        print(f"{imported - start:.6f} {time.perf_counter() - start:.6f}")
+
+asyncio.run(main())
+"""
+
+
+class ImportRecord(NamedTuple):
+    """One line of the -X importtime output, times in microseconds."""
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> list[ImportRecord]:
+    """
+    Parses the output of `python -X importtime`.
+
+    Args:
+        output (str): The standard error of the interpreter.
+
+    Returns:
+        list[ImportRecord]: The imported modules in the order their imports completed.
+    """
+    records = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        module = name.lstrip()
+        records.append(ImportRecord(
+            module=module,
+            self_us=int(self_us),
+            cumulative_us=int(cumulative_us),
+            depth=(len(name) - len(module) - 1) // 2,
+        ))
+    return records
+
+
+def measure_imports(module: str) -> list[ImportRecord]:
+    """
+    Imports a module in a fresh interpreter with `-X importtime`.
+
+    Args:
+        module (str): The module to import.
+
+    Returns:
+        list[ImportRecord]: The imported modules.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    )
+    return parse_importtime(result.stderr)
+
+
+def measure_ready(module: str) -> tuple[float, float]:
+    """
+    Measures the time until a fresh interpreter has imported the application and run its lifespan startup.
+
+    Args:
+        module (str): The module defining `app`.
+
+    Returns:
+        tuple[float, float]: The import time and the time to ready in seconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", READY_SCRIPT, module],
+        capture_output=True, text=True, check=True
+    )
+    imported, ready = result.stdout.split()[-2:]
+    return float(imported), float(ready)
+
+
+def report(module: str, top: int) -> str:
+    """
+    Builds the startup report.
+
+    Args:
+        module (str): The module to import.
+        top (int): The number of entries of every table.
+
+    Returns:
+        str: The report.
+    """
+    records = measure_imports(module)
+    imported, ready = measure_ready(module)
+
+    packages: dict[str, int] = defaultdict(int)
+    for record in records:
+        packages[record.module.split(".")[0]] += record.self_us
+
+    lines = [
+        f"Startup of {module}: imported in {imported * 1000:.0f} ms, ready in {ready * 1000:.0f} ms, "
+        f"{len(records)} modules",
+        "",
+        f"Top {top} packages by import time (self, ms):",
+    ]
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        lines.append(f"  {self_us / 1000:9.1f}  {package}")
+
+    lines += ["", f"Top {top} modules by cumulative import time (ms):"]
+    for record in sorted(records, key=lambda item: item.cumulative_us, reverse=True)[:top]:
+        lines.append(f"  {record.cumulative_us / 1000:9.1f}  {'  ' * record.depth}{record.module}")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reports where the startup time of a worker goes.")
+    parser.add_argument("--module", default="app.main", help="The module defining the application")
+    parser.add_argument("--top", type=int, default=15, help="The number of entries of every table")
+    args = parser.parse_args()
+    print(report(args.module, args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+from typing import Callable
+
+
+class MetricsRegistry:
+    """
+    Collects runtime counters from the application components.
+
+    Components register a callable returning a dictionary of their counters;
+    the registry calls all of them when metrics are requested.
+    Counters are per worker process.
+    """
+
+    def __init__(self) -> None:
+        self._sources: dict[str, Callable[[], dict]] = {}
+
+    def register(self, name: str, source: Callable[[], dict]) -> None:
+        """
+        Registers a metrics source.
+
+        Args:
+            name (str): The name under which the counters are reported.
+            source (Callable[[], dict]): A callable returning the current counters.
+        """
+        self._sources[name] = source
+
+    def collect(self) -> dict:
+        """
+        Collects the counters of all registered sources.
+
+        Returns:
+            dict: The counters keyed by source name.
+        """
+        return {name: source() for name, source in self._sources.items()}
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,179 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Optional
+
+from aiohttp import ClientError
+from fastapi.logger import logger
+from yarl import URL
+
+from app.utils.cache import LRUCache
+from app.utils.config import settings
+from app.utils.http import upstream
+from app.utils.metrics import metrics
+from app.utils.segment_cache import segment_cache, segment_cache_key
+from app.utils.singleflight import SingleFlight
+
+# Upstream headers kept with segments prefetched into memory
+VALIDATOR_HEADERS = ("Accept-Ranges", "ETag", "Last-Modified")
+
+
+@dataclass
+class PrefetchedSegment:
+    body: bytes
+    content_type: str
+    # The upstream Accept-Ranges, ETag and Last-Modified headers
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+class SegmentPrefetcher:
+    """
+    Warms the next segments of a media playlist while the player is still fetching the current one.
+
+    `HLSReplacer` records the successors of every segment it rewrites; a segment request then
+    starts background fetches of its next `depth` successors. Prefetched segments go to the
+    disk segment cache when it is enabled, otherwise to a short-lived in-memory cache with a
+    byte budget. A request for a segment that is still being prefetched joins that fetch.
+
+    The successor index and the in-memory cache are per worker: a segment requested from
+    a worker other than the one that served its playlist is not prefetched.
+    """
+
+    def __init__(self, depth: int, max_bytes: int, ttl: float, index_size: int) -> None:
+        """
+        Initializes the prefetcher.
+
+        Args:
+            depth (int): The number of successors fetched ahead. 0 disables prefetching.
+            max_bytes (int): The byte budget of the in-memory cache.
+            ttl (float): The time-to-live of in-memory entries in seconds.
+            index_size (int): The maximum number of segments whose successors are remembered.
+        """
+        self.depth = depth
+        self.max_in_flight = depth * 8
+
+        self.successors = LRUCache(max_items=index_size)
+        self.memory = LRUCache(max_items=index_size, max_bytes=max_bytes, ttl=ttl)
+        self.flights = SingleFlight()
+        self._tasks: set[asyncio.Task] = set()
+
+        self.scheduled = 0
+        self.fetched = 0
+        self.failed = 0
+        self.skipped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.depth > 0
+
+    def record(self, urls: list[str]) -> None:
+        """
+        Remembers the successors of every segment of a media playlist.
+
+        Args:
+            urls (list[str]): The upstream segment URLs in playlist order.
+        """
+        for i, url in enumerate(urls[:-1]):
+            self.successors.set(url, tuple(urls[i + 1:i + 1 + self.depth]))
+
+    def schedule(self, url: str) -> None:
+        """
+        Starts background fetches of the successors of a segment that are not cached yet.
+
+        Args:
+            url (str): The upstream URL of the requested segment.
+        """
+        for successor in self.successors.get(url, ()):
+            key = segment_cache_key(successor)
+            if self.flights.in_flight(key) or self._is_cached(key):
+                continue
+            if len(self._tasks) >= self.max_in_flight:
+                self.skipped += 1
+                return
+
+            self.scheduled += 1
+            task = asyncio.ensure_future(self.flights.do(key, lambda _url=successor, _key=key: self._fetch(_url, _key)))
+            # Keep a reference so the task is not garbage collected while running
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _is_cached(self, key: str) -> bool:
+        # Disk entries are checked by the fetch itself, off the event loop
+        return not segment_cache.enabled and key in self.memory
+
+    async def _fetch(self, url: str, key: str) -> None:
+        if segment_cache.enabled and await asyncio.to_thread(segment_cache.exists, key):
+            return
+        try:
+            async with upstream.session.get(URL(url, encoded=True), headers={"Accept-Encoding": "identity"}) as resp:
+                if resp.status != 200:
+                    self.failed += 1
+                    return
+
+                content_type = resp.headers.get("Content-Type", "application/octet-stream")
+                if segment_cache.enabled:
+                    writer = segment_cache.writer(key, content_type, resp.content_length)
+                    if writer is None:
+                        return
+                    try:
+                        async for chunk in resp.content.iter_chunked(settings.STREAM_CHUNK_MAX):
+                            await writer.write(chunk)
+                    except BaseException:
+                        writer.abort()
+                        raise
+                    await writer.commit()
+                else:
+                    body = await resp.read()
+                    headers = {name: resp.headers[name] for name in VALIDATOR_HEADERS if name in resp.headers}
+                    segment = PrefetchedSegment(body=body, content_type=content_type, headers=headers)
+                    self.memory.set(key, segment, size=len(body))
+                self.fetched += 1
+        except (ClientError, asyncio.TimeoutError, OSError) as e:
+            self.failed += 1
+            logger.warning(f"Error prefetching segment. Details: {e}")
+
+    async def take(self, url: str) -> Optional[PrefetchedSegment]:
+        """
+        Waits for a running prefetch of the segment and returns it from the in-memory cache.
+
+        When the disk cache is enabled, the segment is left there for the regular cache lookup.
+
+        Args:
+            url (str): The upstream URL of the requested segment.
+
+        Returns:
+            Optional[PrefetchedSegment]: The prefetched segment, or None.
+        """
+        key = segment_cache_key(url)
+        if self.flights.in_flight(key):
+            # Joins the running fetch instead of requesting the segment a second time
+            await self.flights.do(key, lambda: self._fetch(url, key))
+        if segment_cache.enabled:
+            return None
+        return self.memory.get(key)
+
+    def stats(self) -> dict:
+        """
+        Returns the prefetch counters.
+
+        Returns:
+            dict: Depth, scheduled, fetched, failed and skipped prefetches, running fetches and memory cache counters.
+        """
+        return {
+            "depth": self.depth,
+            "scheduled": self.scheduled,
+            "fetched": self.fetched,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "in_flight": len(self._tasks),
+            "joined": self.flights.coalesced,
+            "memory": self.memory.stats(),
+        }
+
+
+prefetcher = SegmentPrefetcher(
+    depth=settings.SEGMENT_PREFETCH,
+    max_bytes=settings.SEGMENT_PREFETCH_BYTES,
+    ttl=settings.SEGMENT_PREFETCH_TTL,
+    index_size=settings.SEGMENT_PREFETCH_INDEX_SIZE
+)
+metrics.register("segment_prefetch", prefetcher.stats)
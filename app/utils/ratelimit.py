@@ -0,0 +1,289 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi.logger import logger
+
+from app.utils.config import settings
+from app.utils.metrics import metrics
+
+# Shared memory slot: 64-bit key hash, available tokens and the time they were computed at
+SLOT = struct.Struct("<Qdd")
+
+
+@dataclass(frozen=True)
+class Budget:
+    """A token bucket budget: tokens added per second and the bucket capacity."""
+    rate: float
+    burst: float
+
+
+def parse_budget(spec: str) -> Optional[Budget]:
+    """
+    Parses a budget setting of the form "<tokens per second>/<burst>".
+
+    Args:
+        spec (str): The budget setting. An empty string means no budget.
+
+    Returns:
+        Optional[Budget]: The budget, or None when there is no limit.
+    """
+    if not spec.strip():
+        return None
+    rate, _, burst = spec.partition("/")
+    budget = Budget(rate=float(rate), burst=float(burst or rate))
+    if budget.rate <= 0 or budget.burst < 1:
+        raise ValueError(f"Invalid rate limit budget: {spec}")
+    return budget
+
+
+def refill(tokens: float, last: float, now: float, budget: Budget) -> tuple[float, float]:
+    """
+    Takes one token from a bucket.
+
+    Args:
+        tokens (float): The tokens left at the last update.
+        last (float): The time of the last update.
+        now (float): The current time.
+        budget (Budget): The budget of the bucket.
+
+    Returns:
+        tuple[float, float]: The tokens left, and the seconds until a token is available (0 if one was taken).
+    """
+    tokens = min(budget.burst, tokens + max(now - last, 0) * budget.rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / budget.rate
+
+
+class MemoryBackend:
+    """
+    Token buckets of the current worker; every uvicorn worker enforces its own budgets.
+
+    The least recently used buckets are dropped beyond `slots` entries, which only gives their clients a full bucket.
+    """
+
+    def __init__(self, slots: int) -> None:
+        self.slots = slots
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def acquire(self, key: str, budget: Budget) -> float:
+        """
+        Takes one token from the bucket of the key.
+
+        Args:
+            key (str): The bucket key.
+            budget (Budget): The budget of the bucket.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until one is available.
+        """
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(key, (budget.burst, now))
+        tokens, wait = refill(tokens, last, now, budget)
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.slots:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def refund(self, key: str, budget: Budget) -> None:
+        """
+        Puts back a token taken by `acquire`.
+
+        Args:
+            key (str): The bucket key.
+            budget (Budget): The budget of the bucket.
+        """
+        if key in self._buckets:
+            tokens, last = self._buckets[key]
+            self._buckets[key] = (min(budget.burst, tokens + 1), last)
+
+
+class SharedMemoryBackend:
+    """
+    Token buckets shared by all workers of the host through a memory-mapped file (e.g. in /dev/shm).
+
+    The file is a direct-mapped table of `slots` buckets; each update holds an fcntl
+    lock on the range of its slot only. A key landing in a slot owned by another key
+    takes the slot over with a full bucket, so collisions can only loosen a limit.
+    """
+
+    def __init__(self, path: str, slots: int) -> None:
+        self.path = path
+        self.slots = slots
+        self._fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+
+    def _open(self) -> mmap.mmap:
+        if self._map is None:
+            size = SLOT.size * self.slots
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            # Every worker grows the file to the same size; new bytes read as empty slots
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._fd = fd
+            self._map = mmap.mmap(fd, size)
+        return self._map
+
+    def _slot(self, key: str) -> tuple[int, int]:
+        # The built-in hash is randomized per process, so the slot is derived from a stable digest
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        return digest, (digest % self.slots) * SLOT.size
+
+    def acquire(self, key: str, budget: Budget) -> float:
+        """
+        Takes one token from the bucket of the key.
+
+        Args:
+            key (str): The bucket key.
+            budget (Budget): The budget of the bucket.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until one is available.
+        """
+        data = self._open()
+        digest, offset = self._slot(key)
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, SLOT.size, offset)
+        try:
+            # CLOCK_MONOTONIC is shared by all processes of the host
+            now = time.monotonic()
+            owner, tokens, last = SLOT.unpack_from(data, offset)
+            if owner != digest or last > now:
+                tokens, last = budget.burst, now
+            tokens, wait = refill(tokens, last, now, budget)
+            SLOT.pack_into(data, offset, digest, tokens, now)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, SLOT.size, offset)
+        return wait
+
+    def refund(self, key: str, budget: Budget) -> None:
+        """
+        Puts back a token taken by `acquire`, unless another key has taken the slot over since.
+
+        Args:
+            key (str): The bucket key.
+            budget (Budget): The budget of the bucket.
+        """
+        data = self._open()
+        digest, offset = self._slot(key)
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, SLOT.size, offset)
+        try:
+            owner, tokens, last = SLOT.unpack_from(data, offset)
+            if owner == digest:
+                SLOT.pack_into(data, offset, digest, min(budget.burst, tokens + 1), last)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, SLOT.size, offset)
+
+
+class RateLimiter:
+    """
+    Limits the request rate of every route class per client and in total.
+
+    Each class (video extraction, manifest, segment) has a per-client budget and
+    an optional global budget; an accepted request takes one token from both.
+    """
+
+    def __init__(self, backend, budgets: dict[str, tuple[Optional[Budget], Optional[Budget]]]) -> None:
+        """
+        Initializes the limiter.
+
+        Args:
+            backend: The bucket storage, `MemoryBackend` or `SharedMemoryBackend`.
+            budgets (dict): The per-client and global budgets keyed by route class.
+        """
+        self.backend = backend
+        self.budgets = budgets
+
+        self.allowed = dict.fromkeys(budgets, 0)
+        self.limited = dict.fromkeys(budgets, 0)
+
+    def check(self, route_class: str, client: str) -> float:
+        """
+        Takes a token for a request of the client.
+
+        Args:
+            route_class (str): The route class of the request.
+            client (str): The client identifier (IP address).
+
+        Returns:
+            float: 0 if the request may proceed, otherwise the seconds the client should wait.
+        """
+        client_budget, global_budget = self.budgets[route_class]
+        try:
+            client_key = f"{route_class}:{client}"
+            wait = self.backend.acquire(client_key, client_budget) if client_budget else 0.0
+            if not wait and global_budget:
+                wait = self.backend.acquire(f"{route_class}:*", global_budget)
+                if wait and client_budget:
+                    # A request rejected by the global budget does not cost the client its token
+                    self.backend.refund(client_key, client_budget)
+        except OSError as e:
+            # A broken shared memory file must not take the service down
+            logger.warning(f"Error checking rate limit. Details: {e}")
+            return 0.0
+
+        if wait:
+            self.limited[route_class] += 1
+        else:
+            self.allowed[route_class] += 1
+        return wait
+
+    @staticmethod
+    def retry_after(wait: float) -> str:
+        """
+        Formats a wait time for the Retry-After header.
+
+        Args:
+            wait (float): The wait time in seconds.
+
+        Returns:
+            str: The whole number of seconds, at least 1.
+        """
+        return str(max(1, math.ceil(wait)))
+
+    def stats(self) -> dict:
+        """
+        Returns the limiter counters of the worker.
+
+        Returns:
+            dict: Allowed and limited requests per route class.
+        """
+        return {
+            "backend": type(self.backend).__name__,
+            "allowed": dict(self.allowed),
+            "limited": dict(self.limited),
+        }
+
+
+def create_backend():
+    """
+    Creates the bucket storage selected by `RATE_LIMIT_BACKEND`.
+
+    Returns:
+        The backend.
+    """
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        return MemoryBackend(settings.RATE_LIMIT_SLOTS)
+    if settings.RATE_LIMIT_BACKEND == "shm":
+        return SharedMemoryBackend(settings.RATE_LIMIT_SHM_PATH, settings.RATE_LIMIT_SLOTS)
+    raise ValueError(f"Unknown rate limit backend: {settings.RATE_LIMIT_BACKEND}")
+
+
+rate_limiter = RateLimiter(
+    backend=create_backend(),
+    budgets={
+        "video": (parse_budget(settings.RATE_LIMIT_VIDEO), parse_budget(settings.RATE_LIMIT_VIDEO_GLOBAL)),
+        "manifest": (parse_budget(settings.RATE_LIMIT_MANIFEST), parse_budget(settings.RATE_LIMIT_MANIFEST_GLOBAL)),
+        "segment": (parse_budget(settings.RATE_LIMIT_SEGMENT), parse_budget(settings.RATE_LIMIT_SEGMENT_GLOBAL)),
+    }
+)
+metrics.register("rate_limit", rate_limiter.stats)
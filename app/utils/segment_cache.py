@@ -0,0 +1,380 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from fastapi.logger import logger
+
+from app.utils.config import settings
+from app.utils.metrics import metrics
+
+# Parameters of googlevideo URLs that change between sessions and clients without changing the content
+VOLATILE_PARAMS = frozenset({
+    "expire", "ei", "ip", "ipbits", "sparams", "lsparams", "sig", "lsig", "signature", "n",
+    "initcwndbps", "mh", "mm", "mn", "ms", "mv", "mvi", "pl", "rms", "bui", "spc", "vprv",
+    "xpc", "requiressl", "met", "pcm2cms", "hang", "keepalive", "pot", "cver", "c", "ctier",
+})
+
+# Temporary files older than this are leftovers of crashed writers
+STALE_TEMP_AGE = 600
+
+# Eviction removes entries until the cache is below this share of its budget
+EVICTION_TARGET = 0.9
+
+# Streamed chunks are buffered and written to disk in batches of this size
+WRITE_BATCH = 1024 * 1024
+
+
+def segment_cache_key(url: str) -> str:
+    """
+    Computes the cache key of an upstream segment URL.
+
+    The key ignores the googlevideo edge host and the volatile query and path parameters
+    (signatures, expiry, client IP), so the same segment fetched by different viewers shares a key.
+
+    Args:
+        url (str): The upstream segment URL.
+
+    Returns:
+        str: The hexadecimal cache key.
+    """
+    parsed = urlsplit(url)
+    host = "" if (parsed.hostname or "").endswith(".googlevideo.com") else parsed.netloc
+    path = parsed.path
+    params = parse_qsl(parsed.query, keep_blank_values=True)
+
+    # HLS segment URLs carry their parameters as /key/value/ path pairs
+    head, separator, tail = path.partition("/videoplayback/")
+    if separator:
+        parts = tail.split("/")
+        params.extend(zip(parts[0::2], parts[1::2]))
+        path = head + "/videoplayback"
+
+    stable = sorted((key, value) for key, value in params if key not in VOLATILE_PARAMS)
+    return hashlib.sha256(f"{host}{path}?{urlencode(stable)}".encode()).hexdigest()
+
+
+@dataclass
+class CachedSegment:
+    path: str
+    content_type: str
+    stat: os.stat_result
+
+
+class SegmentWriter:
+    """
+    Writes a segment into the cache while it is streamed to the client.
+
+    The data goes to a temporary file that is atomically renamed into place on commit,
+    so other workers never see partial entries. Chunks are buffered and written in
+    batches on a worker thread, so disk latency does not stall the event loop.
+    """
+
+    def __init__(self, cache: "SegmentCache", key: str, content_type: str, expected_size: Optional[int]) -> None:
+        self.cache = cache
+        self.key = key
+        self.content_type = content_type
+        self.expected_size = expected_size
+        self.size = 0
+
+        self.path = cache.path(key)
+        suffix = f"{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        self.temp_path = f"{self.path}.{suffix}"
+        self.type_temp_path = f"{self.path}.type.{suffix}"
+        self._file = None
+        self._buffer: list[bytes] = []
+        self._buffered = 0
+        self._discarded = False
+        # Serializes the file operations of the worker threads
+        self._lock = threading.Lock()
+
+    def _write_chunks(self, chunks: list[bytes]) -> None:
+        with self._lock:
+            # A write cancelled on the event loop may still run after the entry was discarded
+            if self._discarded:
+                return
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.temp_path, "wb")
+            for chunk in chunks:
+                self._file.write(chunk)
+
+    async def _flush(self) -> None:
+        chunks, self._buffer, self._buffered = self._buffer, [], 0
+        await asyncio.to_thread(self._write_chunks, chunks)
+
+    async def write(self, chunk: bytes) -> None:
+        """
+        Appends a chunk to the entry.
+
+        Args:
+            chunk (bytes): The chunk of the segment.
+        """
+        self._buffer.append(chunk)
+        self._buffered += len(chunk)
+        self.size += len(chunk)
+        if self._buffered >= WRITE_BATCH:
+            await self._flush()
+
+    def _publish(self) -> None:
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.temp_path, "wb")
+            self._file.close()
+            # The content type is published before the data, so a visible entry always has its type
+            with open(self.type_temp_path, "w") as file:
+                file.write(self.content_type)
+            os.replace(self.type_temp_path, f"{self.path}.type")
+            os.replace(self.temp_path, self.path)
+
+    async def _commit(self) -> None:
+        try:
+            await self._flush()
+            await asyncio.to_thread(self._publish)
+        except OSError as e:
+            logger.warning(f"Error storing segment cache entry. Details: {e}")
+            self.abort()
+            return
+        self.cache.on_stored(self.size)
+
+    async def commit(self) -> None:
+        """
+        Publishes the entry if it is complete, otherwise discards it.
+
+        The commit runs in its own task, so it completes even when the streaming task
+        is cancelled after the last chunk was sent.
+        """
+        if self.expected_size is not None and self.size != self.expected_size:
+            self.abort()
+            return
+        await asyncio.shield(asyncio.get_running_loop().create_task(self._commit()))
+
+    def _discard(self) -> None:
+        with self._lock:
+            self._discarded = True
+            if self._file is not None:
+                self._file.close()
+            for path in (self.temp_path, self.type_temp_path):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def abort(self) -> None:
+        """
+        Discards the entry.
+
+        The files are removed on a worker thread without waiting, so this also works
+        while the streaming task is being cancelled.
+        """
+        self._buffer = []
+        self.cache.aborted += 1
+        asyncio.get_running_loop().run_in_executor(None, self._discard)
+
+
+class SegmentCache:
+    """
+    Optional on-disk cache of upstream segments shared by all uvicorn workers.
+
+    Entries are published with atomic renames, recency is tracked through the file
+    modification time and a byte budget is enforced by an LRU sweep that only one
+    worker runs at a time (guarded by an advisory file lock).
+    Counters are per worker.
+    """
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        """
+        Initializes the cache.
+
+        Args:
+            directory (str): The cache directory. An empty string disables the cache.
+            max_bytes (int): The byte budget of the cache.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self._written_since_sweep = 0
+        self._sweeping = False
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.aborted = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and self.max_bytes > 0
+
+    def path(self, key: str) -> str:
+        """
+        Returns the path of an entry.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str: The path of the entry data file.
+        """
+        return os.path.join(self.directory, key[:2], key)
+
+    def exists(self, key: str) -> bool:
+        """
+        Checks whether an entry is stored, without counting a lookup. Blocking.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            bool: True if the entry is stored.
+        """
+        return os.path.exists(self.path(key))
+
+    def _find(self, key: str) -> Optional[CachedSegment]:
+        path = self.path(key)
+        try:
+            stat = os.stat(path)
+            with open(f"{path}.type") as file:
+                content_type = file.read() or "application/octet-stream"
+            os.utime(path)
+        except OSError:
+            return None
+        return CachedSegment(path=path, content_type=content_type, stat=stat)
+
+    async def lookup(self, key: str) -> Optional[CachedSegment]:
+        """
+        Finds an entry and marks it as recently used, on a worker thread.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            Optional[CachedSegment]: The entry, or None on a miss.
+        """
+        cached = await asyncio.to_thread(self._find, key)
+        if cached is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.bytes_saved += cached.stat.st_size
+        return cached
+
+    def writer(self, key: str, content_type: str, expected_size: Optional[int]) -> Optional[SegmentWriter]:
+        """
+        Starts writing an entry.
+
+        Args:
+            key (str): The cache key.
+            content_type (str): The content type of the segment.
+            expected_size (Optional[int]): The upstream Content-Length, if known.
+
+        Returns:
+            Optional[SegmentWriter]: The writer, or None if the segment should not be cached.
+        """
+        if expected_size is not None and expected_size > self.max_bytes // 4:
+            return None
+        return SegmentWriter(self, key, content_type, expected_size)
+
+    def on_stored(self, size: int) -> None:
+        """
+        Accounts a stored entry and schedules an eviction sweep when enough data was written.
+
+        Args:
+            size (int): The size of the stored entry in bytes.
+        """
+        self.stores += 1
+        self._written_since_sweep += size
+        if self._written_since_sweep >= self.max_bytes // 16 and not self._sweeping:
+            self._written_since_sweep = 0
+            self._sweeping = True
+            asyncio.get_running_loop().create_task(self._sweep_async())
+
+    async def _sweep_async(self) -> None:
+        try:
+            self.evictions += await asyncio.to_thread(self.sweep)
+        except Exception as e:
+            logger.warning(f"Error sweeping segment cache. Details: {e}")
+        finally:
+            self._sweeping = False
+
+    def sweep(self) -> int:
+        """
+        Evicts the least recently used entries until the cache fits its budget.
+
+        Skipped when another worker is already sweeping.
+
+        Returns:
+            int: The number of evicted entries.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+
+            now = time.time()
+            entries = []
+            total = 0
+            for subdir in os.scandir(self.directory):
+                if not subdir.is_dir():
+                    continue
+                for entry in os.scandir(subdir.path):
+                    if entry.name.endswith(".type"):
+                        continue
+                    stat = entry.stat()
+                    if entry.name.endswith(".tmp"):
+                        if now - stat.st_mtime > STALE_TEMP_AGE:
+                            self._unlink(entry.path)
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+            evicted = 0
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes * EVICTION_TARGET:
+                    break
+                self._unlink(path)
+                self._unlink(f"{path}.type")
+                total -= size
+                evicted += 1
+            return evicted
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: Hits, misses, hit ratio, stores, aborted writes, evictions and bytes served from disk.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "aborted": self.aborted,
+            "evictions": self.evictions,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+segment_cache = SegmentCache(directory=settings.SEGMENT_CACHE_DIR, max_bytes=settings.SEGMENT_CACHE_BYTES)
+metrics.register("segment_cache", segment_cache.stats)
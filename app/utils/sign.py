@@ -1,18 +1,87 @@
 import base64
+from itertools import cycle
+
+BUFFER_SIZE = 128
+PRIME1 = 31
+PRIME2 = 37
+PRIME3 = 41
+PRIME4 = 43
+SBOX = (
+    0x63, 0x7C, 0x77, 0x7B, 0xF2, 0x6B, 0x6F, 0xC5,
+    0x30, 0x01, 0x67, 0x2B, 0xFE, 0xD7, 0xAB, 0x76
+)
+
+
+def _dynamic_keys() -> tuple:
+    """
+    Precomputes the XOR keys of the buffer initialization.
+
+    The key is multiplied by `PRIME2` modulo 256 after every character, so the sequence
+    is periodic and one period covers inputs of any length.
+
+    :return: One period of the key sequence.
+    """
+    keys = []
+    key = PRIME4
+    while not keys or key != PRIME4:
+        keys.append(key)
+        key = (key * PRIME2) & 0xFF
+    return tuple(keys)
+
+
+DYNAMIC_KEYS = _dynamic_keys()
+
+# Per character position modulo the buffer size: the three buffer positions, the dynamic key and the S-box value.
+# The key period and the S-box size divide the buffer size, so the table repeats every BUFFER_SIZE characters.
+INITIALIZATION_STEPS = tuple(
+    (
+        i % BUFFER_SIZE,
+        (i + 1) % BUFFER_SIZE,
+        (i + 2) % BUFFER_SIZE,
+        DYNAMIC_KEYS[i % len(DYNAMIC_KEYS)],
+        SBOX[i % len(SBOX)],
+    )
+    for i in range(BUFFER_SIZE)
+)
+
+# Per round and position: rotation shifts, the XOR partner with its S-box key, and the mixing partner
+PERMUTATION_ROUNDS = tuple(
+    tuple(
+        (
+            i,
+            i % 8,
+            8 - i % 8,
+            (i + PRIME1) % BUFFER_SIZE,
+            SBOX[(i + PRIME4) % len(SBOX)],
+            (i * 5 + _r) % BUFFER_SIZE,
+        )
+        for i in range(BUFFER_SIZE)
+    )
+    for _r in range(3)
+)
+
+# Per position: the two partners of the final permutation
+FINAL_PERMUTATION = tuple(
+    (i, (i * 7) % BUFFER_SIZE, (i + PRIME3) % BUFFER_SIZE) for i in range(BUFFER_SIZE)
+)
 
 
 class CustomHasher:
+    """
+    Signature hash of the proxy URLs, shared with the web client.
+
+    The index arithmetic of every round is precomputed in module-level tables,
+    so hashing only walks the buffer.
+    """
+
     def __init__(self):
         """Initialize constants and the S-box for non-linear transformation."""
-        self.buffer_size = 128
-        self.prime1 = 31
-        self.prime2 = 37
-        self.prime3 = 41
-        self.prime4 = 43
-        self.sbox = [
-            0x63, 0x7C, 0x77, 0x7B, 0xF2, 0x6B, 0x6F, 0xC5,
-            0x30, 0x01, 0x67, 0x2B, 0xFE, 0xD7, 0xAB, 0x76
-        ]
+        self.buffer_size = BUFFER_SIZE
+        self.prime1 = PRIME1
+        self.prime2 = PRIME2
+        self.prime3 = PRIME3
+        self.prime4 = PRIME4
+        self.sbox = SBOX
 
     def custom_hash(self, input_str: str) -> str:
         """
@@ -26,63 +95,55 @@ class CustomHasher:
         self._final_permutation(buffer)
         return self._convert_to_base64(buffer)
 
-    def _initialize_buffer(self, input_str: str) -> list:
+    @staticmethod
+    def _initialize_buffer(input_str: str) -> list:
         """
         Initialize the buffer with prime-based transformations and a dynamic XOR key.
 
+        The value XORed into the position after the last character is not masked to a byte;
+        the high bits are kept, as they take part in the first rotation.
+
         :param input_str: The input string to initialize the buffer with.
         :return: The initialized buffer.
         """
-        buffer = [0] * self.buffer_size
-        dynamic_key = self.prime4
-
-        for i in range(len(input_str)):
-            buffer[i % self.buffer_size] = (
-                buffer[i % self.buffer_size] + ord(input_str[i]) * self.prime1
-            ) & 0xFF
-            buffer[(i + 1) % self.buffer_size] ^= (
-                ord(input_str[i]) * self.prime2
-            ) ^ dynamic_key
-            buffer[(i + 2) % self.buffer_size] = (
-                (buffer[(i + 2) % self.buffer_size] + ord(input_str[i]) * self.prime3)
-                & 0xFF
-            ) ^ self.sbox[i % len(self.sbox)]
-            dynamic_key = (dynamic_key * self.prime2) & 0xFF
+        buffer = [0] * BUFFER_SIZE
+
+        # PRIME1, PRIME2 and PRIME3 are inlined, as global lookups dominate this loop
+        for code, (j, k, m, key, sbox) in zip(map(ord, input_str), cycle(INITIALIZATION_STEPS)):
+            buffer[j] = (buffer[j] + code * 31) & 0xFF
+            buffer[k] ^= (code * 37) ^ key
+            buffer[m] = ((buffer[m] + code * 41) & 0xFF) ^ sbox
 
         return buffer
 
-    def _perform_chaotic_permutations(self, buffer: list):
+    @staticmethod
+    def _perform_chaotic_permutations(buffer: list):
         """
         Perform multi-round chaotic permutations on the buffer.
 
         :param buffer: The buffer to permute.
         """
-        for _r in range(3):
-            for i in range(len(buffer)):
+        # The mixing multiplier is PRIME1, inlined
+        for steps in PERMUTATION_ROUNDS:
+            for i, left, right, partner, key, mix in steps:
                 # Left rotate
-                buffer[i] = (
-                    (buffer[i] << (i % 8)) | (buffer[i] >> (8 - (i % 8)))
-                ) & 0xFF
-                # XOR with dynamic S-box and key
-                buffer[i] ^= buffer[(i + self.prime1) % self.buffer_size] ^ self.sbox[
-                    (i + self.prime4) % len(self.sbox)
-                ]
-                buffer[i] = (
-                    (buffer[i] + buffer[(i * 5 + _r) % self.buffer_size]) * self.prime1
-                ) & 0xFF
+                value = ((buffer[i] << left) | (buffer[i] >> right)) & 0xFF
+                # XOR with dynamic S-box and key; stored first, as the mixing partner can be the position itself
+                buffer[i] = value ^ buffer[partner] ^ key
+                buffer[i] = ((buffer[i] + buffer[mix]) * 31) & 0xFF
             buffer.reverse()  # Reverse buffer for additional permutation
 
-    def _final_permutation(self, buffer: list):
+    @staticmethod
+    def _final_permutation(buffer: list):
         """
         Apply final permutation and non-linear transformation to the buffer.
 
         :param buffer: The buffer to transform.
         """
-        for i in range(len(buffer)):
-            buffer[i] = self.sbox[buffer[i] % len(self.sbox)] ^ buffer[
-                (i * 7) % self.buffer_size
-            ]
-            buffer[i] ^= buffer[(i + self.prime3) % self.buffer_size]
+        sbox = SBOX
+        for i, mix, partner in FINAL_PERMUTATION:
+            value = sbox[buffer[i] & 15] ^ buffer[mix]
+            buffer[i] = value ^ buffer[partner]
 
     @staticmethod
     def _convert_to_base64(buffer: list) -> str:
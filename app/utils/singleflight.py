@@ -0,0 +1,87 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single in-flight call.
+
+    The first caller for a key starts the call; callers arriving while it is running
+    await the same result (or the same exception) instead of starting their own.
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        """
+        Checks whether a call for the key is currently running.
+
+        Args:
+            key (Hashable): The call key.
+
+        Returns:
+            bool: True if a call for the key is in flight.
+        """
+        return key in self._flights
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs the coroutine function for the key, or joins the call already in flight.
+
+        Args:
+            key (Hashable): The call key.
+            func (Callable[[], Awaitable[Any]]): The coroutine function producing the result.
+
+        Returns:
+            Any: The result of the call.
+        """
+        future = self._flights.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # Shield the shared call so a cancelled waiter does not cancel it for the others
+            return await asyncio.shield(future)
+
+        self.calls += 1
+        future = asyncio.ensure_future(func())
+        self._flights[key] = future
+        future.add_done_callback(lambda _: self._flights.pop(key, None))
+        # Mark the exception as retrieved in case every waiter was cancelled
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return await asyncio.shield(future)
+
+    def lead(self, key: Hashable) -> asyncio.Future:
+        """
+        Starts a call for the key whose result is set by the caller.
+
+        For calls that cannot be wrapped in one coroutine, e.g. a response streamed to the
+        first caller while it is received. Callers of `do` join it until the future is done;
+        the caller must set its result or exception in all cases.
+
+        Args:
+            key (Hashable): The call key, which must not be in flight.
+
+        Returns:
+            asyncio.Future: The future to resolve with the result of the call.
+        """
+        self.calls += 1
+        future = asyncio.get_running_loop().create_future()
+        self._flights[key] = future
+        future.add_done_callback(lambda _: self._flights.pop(key, None))
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return future
+
+    def stats(self) -> dict:
+        """
+        Returns the coalescing counters.
+
+        Returns:
+            dict: Calls started, coalesced requests and calls currently in flight.
+        """
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._flights),
+        }
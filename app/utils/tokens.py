@@ -0,0 +1,55 @@
+from time import time
+
+from app.models.crypto import CryptoObject
+from app.utils.cache import LRUCache
+from app.utils.config import settings
+from app.utils.crypto import Cryptography
+from app.utils.metrics import metrics
+
+
+class TokenResolver:
+    """
+    Resolves proxy URL tokens into validated `CryptoObject` instances.
+
+    Players re-request the same playlists and segments, so resolved tokens are kept
+    in a bounded LRU until they expire, skipping decryption and validation on repeats.
+    """
+
+    def __init__(self, max_items: int) -> None:
+        """
+        Initializes the resolver.
+
+        Args:
+            max_items (int): The maximum number of cached tokens. 0 disables the cache.
+        """
+        self.cryptography = Cryptography()
+        self.cache = LRUCache(max_items=max_items)
+
+    def resolve(self, token: str) -> CryptoObject:
+        """
+        Decrypts and validates a token, using the cache when possible.
+
+        Args:
+            token (str): The token without the file extension.
+
+        Returns:
+            CryptoObject: The upstream URL and client host of the token.
+
+        Raises:
+            InvalidToken: If the token is malformed, forged or expired.
+            ValidationError: If the token data is invalid.
+        """
+        data = self.cache.get(token)
+        if data is None:
+            raw = self.cryptography.decrypt_token(token)
+            data = CryptoObject(**raw)
+
+            # Cached tokens must not outlive the token itself
+            ttl = raw['timestamp'] + settings.CRYPT_TTL - time()
+            if ttl > 0:
+                self.cache.set(token, data, ttl=ttl)
+        return data
+
+
+token_resolver = TokenResolver(max_items=settings.TOKEN_CACHE_SIZE)
+metrics.register("token_cache", token_resolver.cache.stats)
@@ -1,30 +1,64 @@
+import re
 from datetime import datetime, timezone
 
-import aiohttp
+from aiohttp import ClientError
 from fastapi.logger import logger
 
+from app.utils.cache import LRUCache
 from app.utils.config import settings
+from app.utils.http import upstream
+from app.utils.metrics import metrics
+from app.utils.singleflight import SingleFlight
+
+# Cloudflare documents Turnstile response tokens as at most 2048 characters
+TOKEN_MIN_LENGTH = 16
+TOKEN_MAX_LENGTH = 2048
+TOKEN_PATTERN = re.compile(r'0\.[A-Za-z0-9_\-.+/=]+')
+
+# Seconds after the challenge during which a verified token is accepted
+CHALLENGE_TTL = 60
 
 
 class TurnstileValidator:
+    """
+    Validates Cloudflare Turnstile response tokens.
+
+    Malformed tokens are rejected locally, successful verifications are cached for the
+    rest of the token's validity window and concurrent verifications of the same token
+    share one siteverify request on the pooled upstream session.
+    """
+
     def __init__(self):
         self.secret_key = settings.TURNSTILE_KEY
-        self.verify_url = 'https://challenges.cloudflare.com/turnstile/v0/siteverify'
+        self.verify_url = settings.TURNSTILE_VERIFY_URL
+
+        self.verified = LRUCache(max_items=settings.TURNSTILE_CACHE_SIZE)
+        self.verifications = SingleFlight()
+        self.rejected = 0
 
     @staticmethod
     def prevalidate(response_token: str) -> bool:
-        if 600 < len(response_token) < 500:
+        if not TOKEN_MIN_LENGTH <= len(response_token) <= TOKEN_MAX_LENGTH:
             return False
-        if not response_token.startswith("0."):
+        if not TOKEN_PATTERN.fullmatch(response_token):
             return False
 
         return True
 
     @staticmethod
-    def ttl_check(result: dict) -> bool:
+    def remaining_ttl(result: dict) -> float:
+        """
+        Computes how long a verified token stays valid.
+
+        Args:
+            result (dict): The siteverify response.
+
+        Returns:
+            float: The remaining seconds of the validity window; not positive if the token is too old.
+        """
         t_string = result.get("challenge_ts")
         if not t_string:
-            return False
+            return 0
 
         parsed_time = datetime.strptime(t_string, '%Y-%m-%dT%H:%M:%S.%fZ')
         parsed_time = parsed_time.replace(tzinfo=timezone.utc)
@@ -32,31 +66,64 @@ class TurnstileValidator:
         current_utc_time = datetime.now(timezone.utc)
         time_difference = current_utc_time - parsed_time
 
-        if time_difference.total_seconds() > 60:
-            return False
+        return CHALLENGE_TTL - time_difference.total_seconds()
 
-        return True
+    @classmethod
+    def ttl_check(cls, result: dict) -> bool:
+        return cls.remaining_ttl(result) >= 0
 
     async def validate(self, response_token: str) -> bool:
         if settings.SECRET_KEY == "XXXX.DUMMY.TOKEN.XXXX":
             return True
         if not self.prevalidate(response_token):
+            self.rejected += 1
             return False
 
+        if self.verified.get(response_token):
+            return True
+
+        return await self.verifications.do(response_token, lambda: self._verify(response_token))
+
+    async def _verify(self, response_token: str) -> bool:
         payload = {
             'secret': self.secret_key,
             'response': response_token,
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.verify_url, data=payload) as resp:
+        try:
+            async with upstream.session.post(self.verify_url, data=payload) as resp:
                 if resp.status != 200:
                     return False
 
-                result = await resp.json()
-                logger.info(f"Turnstile response: {result}")
+                result = await resp.json(content_type=None)
+        except (ClientError, ValueError) as e:
+            logger.warning(f"Error verifying turnstile token. Details: {e}")
+            return False
+
+        logger.info(f"Turnstile response: {result}")
+
+        ttl = self.remaining_ttl(result)
+        if ttl < 0 or not result.get('success', False):
+            return False
+
+        # Requests repeating the token within its validity window skip the round trip
+        if ttl > 0:
+            self.verified.set(response_token, True, ttl=ttl)
+        return True
+
+    def stats(self) -> dict:
+        """
+        Returns the validator counters.
+
+        Returns:
+            dict: Locally rejected tokens, verification cache and coalescing counters.
+        """
+        return {
+            "rejected": self.rejected,
+            "cache": self.verified.stats(),
+            "verifications": self.verifications.stats(),
+        }
 
-                if not self.ttl_check(result):
-                    return False
 
-                return result.get('success', False)
+turnstile_validator = TurnstileValidator()
+metrics.register("turnstile", turnstile_validator.stats)
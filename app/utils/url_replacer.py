@@ -1,39 +1,80 @@
 import re
+from typing import Any, Type
 
 from fastapi import Request
+from pydantic import AliasChoices, BaseModel
 
-from app.models.ytdlp import YouTubeResponse
+from app.models.ytdlp import Comment, YouTubeResponse
 from app.utils.config import settings
 from app.utils.crypto import Cryptography
 
 
+def model_input_keys(model: Type[BaseModel]) -> frozenset[str]:
+    """
+    Collects the keys a pydantic model reads from its input data.
+
+    Args:
+        model (Type[BaseModel]): The model class.
+
+    Returns:
+        frozenset[str]: The field names, or their validation aliases when defined.
+    """
+    keys = set()
+    for name, field in model.model_fields.items():
+        alias = field.validation_alias
+        if isinstance(alias, AliasChoices):
+            keys.update(choice for choice in alias.choices if isinstance(choice, str))
+        elif isinstance(alias, str):
+            keys.add(alias)
+        else:
+            keys.add(name)
+    return frozenset(keys)
+
+
 class URLValidator:
     """
     This class provides functionality to validate and replace specific video playback URLs
     in a given data structure with encrypted URLs pointing to a local playback endpoint.
+
+    Only the fields kept by `YouTubeResponse` are visited; the rest of the info dict is dropped.
     """
 
+    # Regex pattern to match video playback URLs
+    url_pattern_playback = re.compile(
+        r"https://rr(?P<host>[^/]+)\.(?:googlevideo|c\.youtube)\.com/videoplayback\?(?P<query>.+)"
+    )
+
+    # Regex pattern to match manifest URLs
+    url_pattern_manifest = re.compile(
+        r"https://(?:manifest\.googlevideo\.com|www\.youtube\.com)"
+        r"/api/manifest/hls_(?:variant|playlist)/(?P<query>.+)"
+    )
+
+    # Cheap check run before the regexes; every URL matched by them starts with one of these
+    url_prefixes = ("https://rr", "https://manifest.googlevideo.com/", "https://www.youtube.com/api/manifest/")
+
+    response_keys = model_input_keys(YouTubeResponse)
+    comment_keys = model_input_keys(Comment)
+
     def __init__(self, request: Request) -> None:
         """
-        Initialize the URLValidator with the request object and compile regex patterns.
+        Initialize the URLValidator with the request object and resolve the client host.
 
         Args:
             request (Request): The FastAPI request object.
         """
         self.request = request
 
-        # Regex pattern to match video playback URLs
-        self.url_pattern_playback = re.compile(
-            r"https://rr(?P<host>[^/]+)\.(?:googlevideo|c\.youtube)\.com/videoplayback\?(?P<query>.+)"
-        )
+        # Determine the client host for encryption
+        self.client_host = request.client.host
+        x_host = request.headers.get("X-Client-Host")
+        if settings.REST_MODE and x_host:
+            self.client_host = x_host
 
-        # Regex pattern to match manifest URLs
-        self.url_pattern_manifest = re.compile(
-            r"https://(?:manifest\.googlevideo\.com|www\.youtube\.com)"
-            r"/api/manifest/hls_(?:variant|playlist)/(?P<query>.+)"
-        )
+        self.base_url = f"{request.url.scheme}://{request.url.netloc}"
 
         self.crypto = Cryptography()  # Initialize the Cryptography utility
+        self.minter = self.crypto.minter(self.client_host)
 
     def _replace_url(self, url: str) -> str:
         """
@@ -45,90 +86,91 @@ class URLValidator:
         Returns:
             str: The encrypted local URL if the input URL matches the pattern, otherwise the original URL.
         """
-        # Match video playback URL pattern
-        match_playback = self.url_pattern_playback.search(url)
-
-        # Determine the client host for encryption
-        client_host = self.request.client.host
-        x_host = self.request.headers.get("X-Client-Host")
-        if settings.REST_MODE and x_host:
-            client_host = x_host
+        if not url.startswith(self.url_prefixes):
+            return url
 
         # Replace video playback URL if matched
-        if match_playback:
-            encrypted_data = self.crypto.encrypt_json({
-                'url': url,
-                'client_host': client_host
-            })
-            return f"{self.request.url.scheme}://{self.request.url.netloc}/v1/playback/{encrypted_data}"
-
-        # Match manifest URL pattern
-        match_manifest = self.url_pattern_manifest.search(url)
+        if self.url_pattern_playback.match(url):
+            return f"{self.base_url}/v1/playback/{self.minter.mint(url)}"
 
         # Replace manifest URL if matched
-        if match_manifest:
-            encrypted_data = self.crypto.encrypt_json({
-                'url': url,
-                'client_host': client_host
-            })
-            return f"{self.request.url.scheme}://{self.request.url.netloc}/v1/manifest/hls/{encrypted_data}"
+        if self.url_pattern_manifest.match(url):
+            return f"{self.base_url}/v1/manifest/hls/{self.minter.mint(url)}"
 
         # Return the original URL if no pattern matched
         return url
 
-    def _process_data(self, data: dict | list) -> None:
+    def _rewrite(self, value: Any) -> Any:
         """
-        Recursively searches through the data structure and replaces URLs if they match the pattern.
+        Copies a value, replacing the URLs in all strings it contains.
+
+        The structure is walked iteratively and the input is left untouched.
 
         Args:
-            data (dict | list): The data structure to process. Can be a dictionary or a list.
+            value (Any): The value to copy. Can be a string, a dictionary, a list or a scalar.
+
+        Returns:
+            Any: The copy with the URLs replaced.
         """
-        if isinstance(data, dict):
-            # Iterate through dictionary items
-            for key, value in data.items():
-                if isinstance(value, str):
-                    # Replace URL if value is a string
-                    data[key] = self._replace_url(value)
-                elif isinstance(value, (dict, list)):
-                    # Recursively process nested dictionaries or lists
-                    self._process_data(value)
-
-            # Special handling for 'formats' key in the data
-            if 'formats' in data:
-                filtered_formats = [
-                    item for item in data['formats']
-                    if item['video_ext'] == "mp4" and item['protocol'] == "m3u8_native"
-                ]
-                if filtered_formats:
-                    last_format = filtered_formats[-1]
-                    manifest_url = last_format.get('manifest_url')
-                    if manifest_url:
-                        data['manifest_url'] = self._replace_url(manifest_url)
-                # Remove 'formats' key from the data after processing
-                del data['formats']
-
-        elif isinstance(data, list):
-            # Iterate through list items
-            for i, item in enumerate(data):
-                if isinstance(item, str):
-                    # Replace URL if item is a string
-                    data[i] = self._replace_url(item)
-                elif isinstance(item, (dict, list)):
-                    # Recursively process nested dictionaries or lists
-                    self._process_data(item)
-
-    def replace_urls(self, data: dict | list) -> YouTubeResponse:
+        root = [value]
+        stack: list[tuple[Any, Any]] = [(root, 0)]
+        while stack:
+            container, key = stack.pop()
+            item = container[key]
+            if isinstance(item, str):
+                container[key] = self._replace_url(item)
+            elif isinstance(item, dict):
+                container[key] = item = dict(item)
+                stack.extend((item, _key) for _key in item)
+            elif isinstance(item, list):
+                container[key] = item = list(item)
+                stack.extend((item, i) for i in range(len(item)))
+        return root[0]
+
+    def _select_manifest_url(self, data: dict) -> Any:
         """
-        Replaces all video playback URLs in the given data structure with encrypted local URLs
-        if they match the pattern.
+        Picks the HLS manifest URL of the last MP4 m3u8 format, falling back to the top-level one.
 
         Args:
-            data (dict | list): The data structure to process. Can be a dictionary or a list.
+            data (dict): The info dict returned by yt_dlp.
 
         Returns:
-            YouTubeResponse: The data structure with the URLs replaced if matched.
+            Any: The manifest URL before replacement, or None.
+        """
+        manifest_url = data.get('manifest_url')
+        filtered_formats = [
+            item for item in data.get('formats') or []
+            if item.get('video_ext') == "mp4" and item.get('protocol') == "m3u8_native"
+        ]
+        if filtered_formats:
+            manifest_url = filtered_formats[-1].get('manifest_url') or manifest_url
+        return manifest_url
+
+    def replace_urls(self, data: dict) -> YouTubeResponse:
         """
-        # Process the data to replace URLs
-        self._process_data(data)
+        Replaces the video playback and manifest URLs in the fields kept by `YouTubeResponse`
+        with encrypted local URLs if they match the pattern.
+
+        The input data is not modified, so it can be shared between requests.
+
+        Args:
+            data (dict): The info dict returned by yt_dlp.
+
+        Returns:
+            YouTubeResponse: The response with the URLs replaced if matched.
+        """
+        selected = {key: data[key] for key in self.response_keys if key in data}
+
+        manifest_url = self._select_manifest_url(data)
+        if manifest_url is not None:
+            selected['manifest_url'] = manifest_url
+
+        if selected.get('comments'):
+            selected['comments'] = [
+                {key: value for key, value in comment.items() if key in self.comment_keys}
+                if isinstance(comment, dict) else comment
+                for comment in selected['comments']
+            ]
+
         # Return the processed data as a YouTubeResponse object
-        return YouTubeResponse(**data)
+        return YouTubeResponse(**self._rewrite(selected))
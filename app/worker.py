@@ -0,0 +1,6 @@
+from uvicorn_worker import UvicornWorker as BaseUvicornWorker
+
+
+class UvicornWorker(BaseUvicornWorker):
+    """Gunicorn worker running uvicorn with the event loop and HTTP implementation of start.sh"""
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "h11"}
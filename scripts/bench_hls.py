@@ -0,0 +1,236 @@
+"""
+Benchmarks the line-based HLS rewriter against the m3u8-based one it replaced.
+
+The baseline, which parsed and re-rendered the whole manifest with the m3u8
+package, is embedded below. The m3u8 package is no longer a dependency;
+without it only the current rewriter is timed.
+
+Media playlists are also checked for equivalence: after decrypting the tokens,
+both outputs must parse to the same playlist, also when the current rewriter
+is fed in small chunks. Master playlists are only timed, as the variant
+selection has changed since (best bandwidth per resolution instead of first).
+
+Usage: python scripts/bench_hls.py
+"""
+
+import asyncio
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.config import settings  # noqa: E402
+from app.utils.crypto import Cryptography  # noqa: E402
+from app.utils.hls import HLSReplacer  # noqa: E402
+
+try:
+    import m3u8
+except ImportError:
+    m3u8 = None
+
+EXPIRE = int(time.time()) + 6 * 3600
+RESOLUTIONS = ("256x144", "426x240", "640x360", "854x480", "1280x720", "1920x1080")
+TOKEN_PATTERN = re.compile(r"http://localhost/v1/manifest/(?:hls|segment)/([A-Za-z0-9_\-]+)\.(?:m3u8|ts)")
+
+
+class FakeRequest:
+    """The request attributes read by the rewriters."""
+    class client:
+        host = "127.0.0.1"
+
+    class url:
+        scheme = "http"
+        netloc = "localhost"
+
+    headers: dict = {}
+
+
+def master_playlist(variants: int) -> str:
+    """Builds a master playlist with an audio rendition and VP9/AVC variants."""
+    lines = ["#EXTM3U", "#EXT-X-INDEPENDENT-SEGMENTS",
+             '#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud",NAME="en",DEFAULT=YES,URI="https://manifest.googlevideo.com'
+             f'/api/manifest/hls_playlist/expire/{EXPIRE}/id/a/itag/140/playlist/index.m3u8"']
+    for i in range(variants):
+        codec = "vp09.00.51.08" if i % 3 else "avc1.4d401e"
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={100000 + (i * 7919) % 50000 + i * 1000},'
+                     f'CODECS="{codec},mp4a.40.2",RESOLUTION={RESOLUTIONS[i % 6]},FRAME-RATE=30,AUDIO="aud"')
+        lines.append(f"https://manifest.googlevideo.com/api/manifest/hls_playlist/expire/{EXPIRE}"
+                     f"/id/a/itag/{200 + i}/playlist/index.m3u8")
+    return "\n".join(lines) + "\n"
+
+
+def media_playlist(segments: int, key: bool = True, init: bool = True) -> str:
+    """Builds a VOD media playlist, optionally with an encryption key and an initialization map."""
+    base = f"https://rr1---sn-x.googlevideo.com/videoplayback/id/a/itag/243/source/yt/expire/{EXPIRE}"
+    lines = ["#EXTM3U", "#EXT-X-VERSION:6", "#EXT-X-TARGETDURATION:5", "#EXT-X-PLAYLIST-TYPE:VOD",
+             "#EXT-X-MEDIA-SEQUENCE:0"]
+    if init:
+        lines.append(f'#EXT-X-MAP:URI="{base}/sq/0/file/init.mp4"')
+    if key:
+        lines.append('#EXT-X-KEY:METHOD=AES-128,URI="https://rr1---sn-x.googlevideo.com/key"')
+    for i in range(segments):
+        lines += ["#EXTINF:5.000,", f"{base}/sig/ABC/sq/{i}/file/seg.ts"]
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def baseline_replace_manifest_links(manifest_content: str, request) -> str:
+    """The m3u8-based rewriter as it was before the line-based one, without the prefetch hook."""
+    playlist = m3u8.loads(manifest_content)  # Parse the manifest content
+
+    # Determine the client host for encryption
+    client_host = request.client.host
+    x_host = request.headers.get("X-Client-Host")
+    if settings.REST_MODE and x_host:
+        client_host = x_host
+
+    # All tokens of the manifest share the client host and the timestamp
+    minter = Cryptography().minter(client_host)
+    _host = f"{request.url.scheme}://{request.url.netloc}"
+
+    def local_url(url: str, token: str) -> str:
+        """
+        Constructs the local URL of a given HLS segment or playlist from its token.
+
+        Args:
+            url (str): The original URL to be replaced.
+            token (str): The token minted for the original URL.
+
+        Returns:
+            str: The new encrypted URL.
+        """
+        # Determine the new URL based on the type (playlist or segment)
+        if 'hls_playlist' in url:
+            return f"{_host}/v1/manifest/hls/{token}.m3u8"
+        return f"{_host}/v1/manifest/segment/{token}.ts"
+
+    def replace_url(url: str) -> str:
+        """
+        Constructs and returns a new encrypted URL for a given HLS segment or playlist.
+
+        Args:
+            url (str): The original URL to be replaced.
+
+        Returns:
+            str: The new encrypted URL.
+        """
+        return local_url(url, minter.mint(url))
+
+    # Replace URLs in segments and associated keys, minting their tokens in one batch
+    targets = []
+    if playlist.segments:
+        for segment in playlist.segments:
+            targets.append(segment)  # Replace segment URL
+
+            # Replace key URL if present
+            if segment.key and segment.key.uri:
+                targets.append(segment.key)
+
+            # Replace initialization section URL if present
+            if segment.init_section and segment.init_section.uri:
+                targets.append(segment.init_section)
+
+    # Key objects are shared between segments, so each object is replaced once,
+    # and repeated URIs get the same token so unchanged keys and maps are not re-emitted
+    targets = list({id(target): target for target in targets}.values())
+    uris = list(dict.fromkeys(target.uri for target in targets))
+    tokens = dict(zip(uris, minter.mint_many(uris)))
+    for target in targets:
+        target.uri = local_url(target.uri, tokens[target.uri])
+
+    # Replace URLs in media segments
+    if playlist.media:
+        for media in playlist.media:
+            media.uri = replace_url(media.uri)
+
+    # Optimize and replace URLs in resolution groups
+    resolution_groups = {}
+    i = 0
+    while i < len(playlist.playlists):
+        p = playlist.playlists[i]
+
+        # Filter out non-MP4 (e.g., VP9) streams
+        if 'vp09' not in p.stream_info.codecs:
+            del playlist.playlists[i]
+            continue  # Skip incrementing i to check the next item at the same index
+
+        resolution = p.stream_info.resolution
+        if resolution not in resolution_groups:
+            # Add a new resolution group if it doesn't exist
+            resolution_groups[resolution] = p
+            p.uri = replace_url(p.uri)
+            i += 1
+        else:
+            existing_playlist = resolution_groups[resolution]
+            if p.stream_info.bandwidth > existing_playlist.stream_info.bandwidth:
+                # Replace the existing playlist with a higher bandwidth one
+                resolution_groups[resolution] = p
+                p.uri = replace_url(p.uri)
+                del playlist.playlists[i]
+            else:
+                # Remove the current playlist if a better one already exists
+                del playlist.playlists[i]
+
+    # Return the updated manifest content as a string
+    updated_manifest = playlist.dumps()
+    return updated_manifest
+
+
+def normalize(text: str) -> str:
+    """Replaces the tokens by their URLs and re-renders the playlist with m3u8."""
+    cryptography = Cryptography()
+    text = TOKEN_PATTERN.sub(lambda match: "P:" + cryptography.decrypt_token(match.group(1))["url"], text)
+    return m3u8.loads(text).dumps()
+
+
+def stream(manifest: str, chunk_size: int) -> str:
+    """Runs the streaming path of the current rewriter on the manifest cut into chunks."""
+    async def chunks():
+        data = manifest.encode()
+        for i in range(0, len(data), chunk_size):
+            yield data[i:i + chunk_size]
+
+    async def run() -> str:
+        return "".join([piece async for piece in HLSReplacer(FakeRequest).stream(chunks())])
+
+    return asyncio.run(run())
+
+
+def timed(function, manifest: str, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function(manifest, FakeRequest)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main() -> None:
+    if m3u8 is None:
+        print("m3u8 is not installed: the baseline is skipped")
+
+    cases = (
+        ("40-variant master", master_playlist(40), 200, False),
+        ("500-segment VOD with key and map", media_playlist(500), 30, True),
+        ("50-segment VOD", media_playlist(50, key=False, init=False), 200, True),
+    )
+    for name, manifest, iterations, compare in cases:
+        current = timed(HLSReplacer.replace_manifest_links, manifest, iterations)
+        if m3u8 is None:
+            print(f"{name}: {current:.2f} ms")
+            continue
+
+        if compare:
+            expected = normalize(baseline_replace_manifest_links(manifest, FakeRequest))
+            if normalize(HLSReplacer.replace_manifest_links(manifest, FakeRequest)) != expected:
+                sys.exit(f"{name}: output differs from the baseline")
+            if normalize(stream(manifest, 777)) != expected:
+                sys.exit(f"{name}: streamed output differs from the baseline")
+
+        baseline = timed(baseline_replace_manifest_links, manifest, iterations)
+        print(f"{name}: m3u8 {baseline:.2f} ms -> line-based {current:.2f} ms ({baseline / current:.1f}x)"
+              + (", equivalent" if compare else ""))
+
+
+if __name__ == "__main__":
+    main()
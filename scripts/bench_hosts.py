@@ -0,0 +1,132 @@
+"""
+Benchmarks the host matcher against the per-pattern loops it replaced, with a large ALLOWED_HOSTS.
+
+The baseline referer check, which built and matched one regex per allowed host on
+every request, and the Host header loop of Starlette's TrustedHostMiddleware are
+embedded below. Both are timed against HostMatcher.match_referer and match_host
+on exact hits, wildcard hits and misses, after checking that they give the same
+allow/deny result (and www. redirect) on a sample of random hosts and ports.
+
+With a few hundred patterns the baseline referer check no longer fits the regex
+cache, so the comparison alone takes about two minutes.
+
+Usage: python scripts/bench_hosts.py [--patterns 600] [--samples 2000]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.hosts import HostMatcher  # noqa: E402
+
+
+def baseline_is_valid_referer_or_origin(host: str, allowed_hosts: list[str]) -> bool:
+    """The referer validation of the baseline RefererCheckMiddleware."""
+    for allowed_host in allowed_hosts:
+        if allowed_host.startswith("*."):
+            # Pattern to match subdomains
+            domain_pattern = re.escape(allowed_host[2:])
+            pattern = rf"^(?:.+\.)?{domain_pattern}(:\d+)?$"
+            if re.match(pattern, host):
+                return True
+        else:
+            # Exact match pattern
+            pattern = rf"^{re.escape(allowed_host)}(:\d+)?$"
+            if re.match(pattern, host):
+                return True
+    return False
+
+
+def baseline_match_host(host: str, allowed_hosts: list[str]) -> tuple[bool, bool]:
+    """The Host header validation of Starlette's TrustedHostMiddleware, with its www. redirect flag."""
+    if "*" in allowed_hosts:
+        return True, False
+    found_www_redirect = False
+    for pattern in allowed_hosts:
+        if host == pattern or (pattern.startswith("*") and host.endswith(pattern[1:])):
+            return True, False
+        elif "www." + host == pattern:
+            found_www_redirect = True
+    return False, found_www_redirect
+
+
+def allowed_hosts(count: int) -> list[str]:
+    """Builds `count` host patterns, half exact and half wildcard, after the default ones."""
+    patterns = ["localhost", "127.0.0.1", "*.trycloudflare.com"]
+    for i in range(count // 2):
+        patterns.append(f"{'www.' if i % 5 == 0 else ''}app{i}.example{i % 7}.com")
+        patterns.append(f"*.tenant{i}.example.net")
+    return patterns
+
+
+def sample_hosts(patterns: list[str], count: int) -> list[str]:
+    """Builds random hosts around the patterns: hits, subdomains, near misses and ports."""
+    rng = random.Random(0)
+    hosts = []
+    for _ in range(count):
+        pattern = rng.choice(patterns).lstrip("*.")
+        host = rng.choice((
+            pattern,
+            f"{rng.choice(('a', 'b.c', 'www', ''))}.{pattern}",
+            pattern.removeprefix("www."),
+            f"x{pattern}",
+            pattern[:-1],
+            f"{pattern}.evil.org",
+            f"{rng.randrange(256)}.{rng.randrange(256)}.0.1",
+        ))
+        if rng.random() < 0.3:
+            host += f":{rng.choice((rng.randrange(65536), 'abc', ''))}"
+        hosts.append(host)
+    return hosts
+
+
+def check(matcher: HostMatcher, patterns: list[str], hosts: list[str]) -> None:
+    """Exits if the matcher and the baselines disagree on any of the hosts."""
+    for host in hosts:
+        if matcher.match_referer(host) != baseline_is_valid_referer_or_origin(host, patterns):
+            sys.exit(f"Referer results differ for {host!r}")
+        name = host.split(":")[0]
+        allowed, redirect = baseline_match_host(name, patterns)
+        if matcher.match_host(name) != allowed or (not allowed and matcher.www_redirect(name) != redirect):
+            sys.exit(f"Host results differ for {name!r}")
+
+
+def timed(function, *args) -> float:
+    number, _ = timeit.Timer(lambda: function(*args)).autorange()
+    return min(timeit.repeat(lambda: function(*args), number=number, repeat=3)) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks the host matcher with a large ALLOWED_HOSTS.")
+    parser.add_argument("--patterns", type=int, default=600, help="The number of allowed host patterns")
+    parser.add_argument("--samples", type=int, default=2000, help="The number of random hosts compared")
+    args = parser.parse_args()
+
+    patterns = allowed_hosts(args.patterns)
+    matcher = HostMatcher(",".join(patterns))
+    check(matcher, patterns, sample_hosts(patterns, args.samples))
+    print(f"{len(patterns)} patterns: referer and Host results identical on {args.samples} random hosts")
+
+    last = args.patterns // 2 - 1
+    cases = (
+        ("exact hit (first)", "localhost"),
+        ("exact hit (last)", f"app{last}.example{last % 7}.com"),
+        ("wildcard hit", f"cdn.tenant{last}.example.net"),
+        ("miss", "attacker.example.org"),
+    )
+    for name, host in cases:
+        referer = f"{host}:8443"
+        print(
+            f"{name}: referer {timed(baseline_is_valid_referer_or_origin, referer, patterns):.1f} -> "
+            f"{timed(matcher.match_referer, referer):.2f} us, "
+            f"Host {timed(baseline_match_host, host, patterns):.1f} -> {timed(matcher.match_host, host):.2f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Benchmarks the pure ASGI middlewares against the BaseHTTPMiddleware ones they replaced.
+
+The baseline NodeMiddleware, ProcessTimeMiddleware and RefererCheckMiddleware,
+which subclassed BaseHTTPMiddleware, are embedded below. Both stacks wrap the
+same application, serving /healthz and a 2 MiB body streamed in 64 KiB chunks
+under /v1/ (so the referer check runs), and are driven in-process through ASGI
+with concurrent requests. No server or client overhead is included, so the
+ratios are larger than behind uvicorn, where the HTTP handling is shared by
+both stacks. The responses of both stacks are checked for the same status,
+headers and body.
+
+Usage: python scripts/bench_middleware.py [--requests 2000] [--concurrency 16]
+"""
+
+import argparse
+import asyncio
+import os
+import platform
+import re
+import sys
+import time
+from typing import Callable
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request, Response  # noqa: E402
+from fastapi.responses import StreamingResponse  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+from app.middleware.node import NodeMiddleware  # noqa: E402
+from app.middleware.process_time import ProcessTimeMiddleware  # noqa: E402
+from app.middleware.referer import RefererCheckMiddleware  # noqa: E402
+from app.routes import healthz  # noqa: E402
+from app.utils.config import settings  # noqa: E402
+
+CHUNK = os.urandom(64 * 1024)
+CHUNKS = 32
+STREAM_PATH = "/v1/manifest/segment/bench.ts"
+
+
+def baseline_is_valid_referer_or_origin(host: str, allowed_hosts: list[str]) -> bool:
+    """The referer validation of the baseline RefererCheckMiddleware."""
+    for allowed_host in allowed_hosts:
+        if allowed_host.startswith("*."):
+            domain_pattern = re.escape(allowed_host[2:])
+            if re.match(rf"^(?:.+\.)?{domain_pattern}(:\d+)?$", host):
+                return True
+        elif re.match(rf"^{re.escape(allowed_host)}(:\d+)?$", host):
+            return True
+    return False
+
+
+class BaselineNodeMiddleware(BaseHTTPMiddleware):
+    """NodeMiddleware as it was before the pure ASGI rewrite."""
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        response = await call_next(request)
+        response.headers["X-Dl-App-Node"] = platform.node()
+        return response
+
+
+class BaselineProcessTimeMiddleware(BaseHTTPMiddleware):
+    """ProcessTimeMiddleware as it was before the pure ASGI rewrite."""
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        start_time = time.time()
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        response.headers["X-Process-Time"] = f"{int(process_time * 1000)} ms"
+        return response
+
+
+class BaselineRefererCheckMiddleware(BaseHTTPMiddleware):
+    """RefererCheckMiddleware as it was before the pure ASGI rewrite, without the logging."""
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        if request.url.path.startswith("/v1/"):
+            x_secret = request.headers.get("X-Secret")
+            if bool(settings.DISABLE_TURNSTILE) and x_secret == settings.SECRET_KEY:
+                return await call_next(request)
+
+            referer = request.headers.get("Referer")
+            origin = request.headers.get("Origin")
+            host = urlparse(referer).netloc if referer else urlparse(origin).netloc
+            if not request.url.path.startswith("/v1/video/"):
+                if not host:
+                    return Response(content=None, status_code=400)
+                if not baseline_is_valid_referer_or_origin(host, settings.ALLOWED_HOSTS.split(",")):
+                    return Response(content=None, status_code=400)
+
+        return await call_next(request)
+
+
+def build_app(middlewares: tuple) -> FastAPI:
+    """Builds the benchmarked application with the middlewares added in the order of app.main."""
+    app = FastAPI()
+    app.include_router(healthz.router)
+
+    @app.get(STREAM_PATH)
+    async def stream() -> StreamingResponse:
+        async def body():
+            for _ in range(CHUNKS):
+                yield CHUNK
+
+        return StreamingResponse(body(), media_type="video/mp2t")
+
+    for middleware in middlewares:
+        app.add_middleware(middleware)
+    return app
+
+
+async def request(app: FastAPI, path: str) -> tuple[int, dict, int]:
+    """Sends a GET request through ASGI and returns the status, the headers and the body size."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"referer", b"http://localhost/")],
+        "client": ("127.0.0.1", 50000), "server": ("localhost", 80),
+    }
+    done = asyncio.Event()
+    received = False
+    status, headers, size = 0, {}, 0
+
+    async def receive() -> dict:
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # The client stays connected until the response is complete
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict) -> None:
+        nonlocal status, headers, size
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            headers = {name.decode(): value.decode() for name, value in message["headers"]}
+        elif message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+
+    await app(scope, receive, send)
+    done.set()
+    return status, headers, size
+
+
+async def load(app: FastAPI, path: str, requests: int, concurrency: int) -> tuple[float, int]:
+    """Sends `requests` requests with `concurrency` in flight and returns the elapsed time and bytes received."""
+    remaining = requests
+    received = 0
+
+    async def client() -> None:
+        nonlocal remaining, received
+        while remaining > 0:
+            remaining -= 1
+            size = (await request(app, path))[2]
+            received += size
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start, received
+
+
+def comparable(response: tuple[int, dict, int]) -> tuple:
+    """Drops the headers whose values legitimately differ between two requests."""
+    status, headers, size = response
+    return status, {name: value for name, value in headers.items() if name != "x-process-time"}, size
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks the BaseHTTPMiddleware and pure ASGI middleware stacks.")
+    parser.add_argument("--requests", type=int, default=2000, help="The number of /healthz requests per stack")
+    parser.add_argument("--concurrency", type=int, default=16, help="The number of requests in flight")
+    args = parser.parse_args()
+
+    stacks = (
+        ("BaseHTTPMiddleware", build_app(
+            (BaselineNodeMiddleware, BaselineProcessTimeMiddleware, BaselineRefererCheckMiddleware)
+        )),
+        ("pure ASGI", build_app((NodeMiddleware, ProcessTimeMiddleware, RefererCheckMiddleware))),
+    )
+    for path in ("/healthz", STREAM_PATH):
+        baseline, current = [comparable(await request(app, path)) for _, app in stacks]
+        if baseline != current:
+            sys.exit(f"{path}: the responses differ: {baseline} != {current}")
+
+    cases = (
+        ("/healthz", "/healthz", args.requests),
+        (f"{CHUNKS * len(CHUNK) >> 20} MiB stream", STREAM_PATH, max(args.requests // 10, args.concurrency)),
+    )
+    for name, path, requests in cases:
+        results = []
+        for _, app in stacks:
+            await load(app, path, args.concurrency, args.concurrency)
+            results.append(await load(app, path, requests, args.concurrency))
+        (before, before_bytes), (after, after_bytes) = results
+        line = f"{name}: {requests / before:.0f} -> {requests / after:.0f} req/s"
+        if path == STREAM_PATH:
+            line += f", {before_bytes / 1e6 / before:.0f} -> {after_bytes / 1e6 / after:.0f} MB/s"
+        print(f"{line} ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""
+Benchmarks segment streaming with fixed 16 KiB chunks against adaptive chunk sizes.
+
+A local upstream serves a 2 MiB segment, and the application runs under uvicorn
+once with STREAM_CHUNK_MIN = STREAM_CHUNK_MAX = 16 KiB (the former fixed chunks)
+and once with the configured adaptive sizes. Every run downloads the segment
+through /v1/manifest/segment and reports the throughput per wall-clock second
+and per CPU-second of the server.
+
+Usage: python scripts/bench_segment_stream.py [--requests 100]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aiohttp import web  # noqa: E402
+
+from app.utils.crypto import Cryptography  # noqa: E402
+
+UPSTREAM_PORT = 8766
+SERVER_PORT = 8777
+SEGMENT = os.urandom(2 * 1024 * 1024)
+HEADERS = {"Referer": "http://localhost/"}
+
+
+def start_upstream() -> None:
+    """Serves the segment on a background thread."""
+    async def segment(_: web.Request) -> web.Response:
+        return web.Response(body=SEGMENT, content_type="video/mp2t")
+
+    app = web.Application()
+    app.router.add_get("/videoplayback/{tail:.*}", segment)
+    thread = threading.Thread(
+        target=web.run_app, args=(app,),
+        kwargs={"host": "127.0.0.1", "port": UPSTREAM_PORT, "print": None, "handle_signals": False},
+        daemon=True
+    )
+    thread.start()
+    time.sleep(1)
+
+
+def server_cpu(pid: int) -> float:
+    """Returns the user and system CPU time of a process in seconds."""
+    with open(f"/proc/{pid}/stat") as file:
+        fields = file.read().split()
+    return (int(fields[13]) + int(fields[14])) / os.sysconf("SC_CLK_TCK")
+
+
+def run(name: str, requests: int, env: dict) -> None:
+    """Starts the application with the given settings and downloads the segment `requests` times."""
+    token = Cryptography().minter("127.0.0.1").mint(f"http://127.0.0.1:{UPSTREAM_PORT}/videoplayback/id/a/seg.ts")
+    url = f"http://127.0.0.1:{SERVER_PORT}/v1/manifest/segment/{token}.ts"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(SERVER_PORT), "--log-level", "warning"],
+        cwd=ROOT, env={**os.environ, "DISABLE_RATE_LIMIT": "1", "SEGMENT_CACHE_DIR": "", **env}
+    )
+    try:
+        time.sleep(3)
+        urllib.request.urlopen(urllib.request.Request(url, headers=HEADERS)).read()
+
+        cpu, start, size = server_cpu(server.pid), time.perf_counter(), 0
+        for _ in range(requests):
+            size += len(urllib.request.urlopen(urllib.request.Request(url, headers=HEADERS)).read())
+        cpu, elapsed = server_cpu(server.pid) - cpu, time.perf_counter() - start
+
+        print(f"{name}: {size / 1e6 / elapsed:.0f} MB/s wall, {size / 1e6 / max(cpu, 1e-3):.0f} MB/s per server CPU-second")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks fixed and adaptive segment streaming.")
+    parser.add_argument("--requests", type=int, default=100, help="The number of segment downloads per run")
+    args = parser.parse_args()
+
+    start_upstream()
+    run("fixed 16 KiB", args.requests, {"STREAM_CHUNK_MIN": "16384", "STREAM_CHUNK_MAX": "16384"})
+    run("adaptive", args.requests, {})
+
+
+if __name__ == "__main__":
+    main()
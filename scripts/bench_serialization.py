@@ -0,0 +1,74 @@
+"""
+Benchmarks the serialization of /v1/video responses.
+
+Compares the former model_dump -> jsonable_encoder -> JSONResponse chain with
+serializing the validated model straight to JSON, on a response with 100
+comments and a 5 KB description, and checks that both produce the same JSON.
+
+Usage: python scripts/bench_serialization.py
+"""
+
+import json
+import os
+import sys
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse, Response  # noqa: E402
+
+from app.models.ytdlp import YouTubeResponse  # noqa: E402
+
+
+def video_info(comments: int = 100) -> dict:
+    """Builds the info dict of a video as returned by the URL replacer."""
+    return {
+        "id": "dQw4w9WgXcQ", "title": "T", "thumbnail": "https://i.ytimg.com/vi/x/maxres.jpg", "description": "d" * 5000,
+        "channel_id": "UC1", "uploader_id": "@u", "channel_url": "https://www.youtube.com/channel/UC1",
+        "uploader_url": "https://www.youtube.com/@u", "duration": 212, "view_count": 10, "age_limit": 0,
+        "categories": ["Music"], "tags": ["a"], "comment_count": comments, "like_count": 5, "channel": "C",
+        "channel_follower_count": 3, "channel_is_verified": True, "upload_date": "20091025", "timestamp": 1256000000,
+        "availability": "public", "display_id": "dQw4w9WgXcQ", "fulltitle": "T", "duration_string": "3:32",
+        "is_live": False, "was_live": False, "epoch": int(time.time()), "resolution": "1920x1080", "fps": 25,
+        "filesize_approx": 1, "manifest_url": "https://x.example/v1/manifest/hls/abc",
+        "thumbnails": [{"url": f"https://i.ytimg.com/vi/x/{i}.jpg", "id": str(i)} for i in range(40)],
+        "heatmap": [{"start_time": i, "end_time": i + 1, "value": 0.5} for i in range(100)],
+        "subtitles": {},
+        "automatic_captions": {
+            "en": [{"url": f"https://www.youtube.com/api/timedtext?v=x&lang=en&fmt={i}"} for i in range(5)]
+        },
+        "comments": [
+            {
+                "id": f"c{i}", "parent": "root", "text": "hello " * 20, "like_count": i, "author_id": "UCa",
+                "author": "@a", "author_thumbnail": "https://yt3.ggpht.com/a.jpg", "author_url": "https://www.youtube.com/@a",
+                "author_is_uploader": False, "author_is_verified": False, "is_favorited": False,
+                "timestamp": 1700000000, "is_pinned": False, "_time_text": "1 year ago",
+            }
+            for i in range(comments)
+        ],
+    }
+
+
+def main() -> None:
+    model = YouTubeResponse(**video_info())
+    variants = (
+        ("jsonable_encoder", lambda: JSONResponse(content=jsonable_encoder(model.model_dump())).body),
+        ("model_dump_json", lambda: Response(content=model.model_dump_json(), media_type="application/json").body),
+    )
+    if json.loads(variants[0][1]()) != json.loads(variants[1][1]()):
+        sys.exit("The serializations differ")
+
+    for name, serialize in variants:
+        duration = min(timeit.repeat(serialize, number=200, repeat=5)) / 200
+        tracemalloc.start()
+        serialize()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name}: {duration * 1e3:.2f} ms per response, peak allocation {peak / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
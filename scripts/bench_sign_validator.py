@@ -0,0 +1,130 @@
+"""
+Benchmarks the sign_validator decorator against the one it replaced.
+
+The baseline decorator, which built a new hasher (the original implementation,
+see sign_check.py) for every request and compared the signatures with `!=`, is
+embedded below. Both decorate the same handler and are timed on the full path:
+signature cache misses (unique URLs), hits (a replayed URL) and rejected
+signatures. They must accept and reject the same requests.
+
+Usage: python scripts/bench_sign_validator.py [--iterations 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from functools import wraps
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Response  # noqa: E402
+from fastapi.logger import logger  # noqa: E402
+
+from sign_check import BaselineHasher  # noqa: E402
+
+from app.decorators.sign import sign_validator, signature_cache  # noqa: E402
+from app.utils.config import settings  # noqa: E402
+
+BASE_URL = "http://localhost:8000/v1/manifest/segment/"
+
+
+class FakeRequest:
+    """The request attributes read by the decorators."""
+
+    def __init__(self, url: str, signature: str | None) -> None:
+        self.url = url
+        self.headers = {"X-Sign": signature} if signature is not None else {}
+
+
+def baseline_sign_validator(func):
+    """sign_validator as it was before the shared hasher and the signature cache."""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        request = kwargs.get("request")
+        if request and not bool(settings.DISABLE_SIGN):
+            client_sign = request.headers.get("X-Sign")
+            if not client_sign:
+                logger.warning(f"X-Sign header not defined for {request.url}")
+                return Response(status_code=400)
+
+            try:
+                _hash = BaselineHasher().custom_hash(str(request.url))
+            except Exception as e:
+                logger.warning(f"Error generating hash for {request.url}. Exception: {e}")
+                return Response(status_code=400)
+
+            if _hash != client_sign:
+                logger.warning(f"Invalid hash for {request.url}")
+                return Response(status_code=400)
+
+        response: Response = await func(*args, **kwargs)
+        return response
+
+    return wrapper
+
+
+async def handler(request: FakeRequest) -> Response:
+    return Response(status_code=200)
+
+
+def segment_url(i: int) -> str:
+    """Builds a segment URL with a token of the usual length."""
+    return f"{BASE_URL}{i:08d}{'A' * 292}.ts"
+
+
+async def timed(endpoint, requests: list[FakeRequest]) -> float:
+    start = time.perf_counter()
+    for request in requests:
+        await endpoint(request=request)
+    return (time.perf_counter() - start) / len(requests) * 1e6
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks the sign_validator decorator.")
+    parser.add_argument("--iterations", type=int, default=2000, help="The number of requests per case")
+    args = parser.parse_args()
+
+    # Both decorators read the setting per request; the rejections are expected
+    settings.DISABLE_SIGN = 0
+    logger.disabled = True
+
+    hasher = BaselineHasher()
+    endpoints = (baseline_sign_validator(handler), sign_validator(handler))
+
+    checks = []
+    for i in range(50):
+        url = segment_url(i)
+        signature = hasher.custom_hash(url)
+        checks += [(FakeRequest(url, signature), 200), (FakeRequest(url, signature[:-1] + "x"), 400),
+                   (FakeRequest(url, ""), 400), (FakeRequest(url, None), 400)]
+    for request, status in checks:
+        for endpoint in endpoints:
+            if (await endpoint(request=request)).status_code != status:
+                sys.exit(f"Unexpected result for {request.url} with X-Sign {request.headers.get('X-Sign')!r}")
+    print(f"Both decorators accept and reject the same {len(checks)} requests")
+
+    replayed = segment_url(0)
+    signature = hasher.custom_hash(replayed)
+    misses = []
+    for i in range(args.iterations):
+        url = segment_url(1000 + i)
+        misses.append(FakeRequest(url, hasher.custom_hash(url)))
+    cases = (
+        ("cache miss", misses),
+        ("cache hit", [FakeRequest(replayed, signature)] * args.iterations),
+        ("rejected", [FakeRequest(replayed, signature[:-1] + "x")] * args.iterations),
+    )
+    for name, requests in cases:
+        before = await timed(endpoints[0], requests)
+        signature_cache.clear()
+        if name != "cache miss":
+            # Hits and rejections of a replayed URL find its signature cached
+            await endpoints[1](request=requests[0])
+        after = await timed(endpoints[1], requests)
+        print(f"{name}: {before:.1f} -> {after:.1f} us per request ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+"""
+Benchmarks the shared upstream session against a session per request.
+
+Before the shared session, the HLS manifest and segment routes opened a new
+aiohttp ClientSession, and so a new connection, for every upstream request.
+A local stub upstream serves a manifest and a 2 MiB segment on a background
+thread, and both are fetched sequentially and concurrently with a session per
+request and with `upstream.session`. The bodies are read the same way in both
+variants, so only the session handling differs. The stub counts the TCP
+connections it accepted.
+
+Against googlevideo the shared session also saves the DNS lookups and TLS
+handshakes, which the plain-HTTP stub does not have.
+
+Usage: python scripts/bench_upstream_session.py [--requests 200] [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import ClientSession, web  # noqa: E402
+from yarl import URL  # noqa: E402
+
+from app.utils.config import settings  # noqa: E402
+from app.utils.http import upstream  # noqa: E402
+
+UPSTREAM_PORT = 8768
+MANIFEST = ("#EXTM3U\n#EXT-X-TARGETDURATION:5\n" + "".join(
+    f"#EXTINF:5.000,\nhttps://rr1---sn-x.googlevideo.com/videoplayback/id/a/itag/243/sq/{i}/file/seg.ts\n"
+    for i in range(100)
+) + "#EXT-X-ENDLIST\n").encode()
+SEGMENT = os.urandom(2 * 1024 * 1024)
+
+# Client ports of the accepted connections
+connections: set[tuple] = set()
+
+
+def start_upstream() -> None:
+    """Serves the manifest and the segment on a background thread."""
+    async def manifest(request: web.Request) -> web.Response:
+        connections.add(request.transport.get_extra_info("peername"))
+        return web.Response(body=MANIFEST, content_type="application/vnd.apple.mpegurl")
+
+    async def segment(request: web.Request) -> web.Response:
+        connections.add(request.transport.get_extra_info("peername"))
+        return web.Response(body=SEGMENT, content_type="video/mp2t")
+
+    app = web.Application()
+    app.router.add_get("/api/manifest/hls_playlist/index.m3u8", manifest)
+    app.router.add_get("/videoplayback/seg.ts", segment)
+    thread = threading.Thread(
+        target=web.run_app, args=(app,),
+        kwargs={"host": "127.0.0.1", "port": UPSTREAM_PORT, "print": None, "handle_signals": False},
+        daemon=True
+    )
+    thread.start()
+    time.sleep(1)
+
+
+async def read(session: ClientSession, url: str) -> int:
+    """Fetches a URL the way the routes do, returning the body size."""
+    size = 0
+    async with session.get(URL(url, encoded=True)) as resp:
+        async for chunk in resp.content.iter_chunked(settings.STREAM_CHUNK_MAX):
+            size += len(chunk)
+    return size
+
+
+async def per_request_session(url: str) -> int:
+    """Fetches a URL with its own session, as the routes did before the shared session."""
+    async with ClientSession() as session:
+        return await read(session, url)
+
+
+async def shared_session(url: str) -> int:
+    """Fetches a URL with the shared session of the worker."""
+    return await read(upstream.session, url)
+
+
+async def load(fetch, url: str, requests: int, concurrency: int) -> float:
+    """Fetches the URL `requests` times with `concurrency` in flight and returns the elapsed time."""
+    remaining = requests
+
+    async def client() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await fetch(url)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks the shared upstream session.")
+    parser.add_argument("--requests", type=int, default=200, help="The number of fetches per case")
+    parser.add_argument("--concurrency", type=int, default=8, help="The number of fetches in flight")
+    args = parser.parse_args()
+
+    start_upstream()
+    base = f"http://127.0.0.1:{UPSTREAM_PORT}"
+    cases = (
+        ("manifest", f"{base}/api/manifest/hls_playlist/index.m3u8"),
+        ("2 MiB segment", f"{base}/videoplayback/seg.ts"),
+    )
+    variants = (("session per request", per_request_session), ("shared session", shared_session))
+    for name, url in cases:
+        if await per_request_session(url) != await shared_session(url):
+            sys.exit(f"{name}: the bodies differ")
+        for concurrency in (1, args.concurrency):
+            results = []
+            for _, fetch in variants:
+                await load(fetch, url, concurrency, concurrency)
+                connections.clear()
+                elapsed = await load(fetch, url, args.requests, concurrency)
+                results.append((elapsed / args.requests * 1000, len(connections)))
+            (before, before_connections), (after, after_connections) = results
+            print(f"{name}, {concurrency} in flight: {before:.2f} -> {after:.2f} ms per fetch ({before / after:.1f}x), "
+                  f"{before_connections} -> {after_connections} connections")
+    await upstream.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+"""
+Benchmarks the YoutubeDL instance pool against building an instance per extraction.
+
+Before the pool, every extraction constructed a YoutubeDL with the default
+extractors and initialized its YouTube extractor. This compares that cost with
+the construction of a pool instance and with checking out a pooled one.
+
+Usage: python scripts/bench_ydl_pool.py [--iterations 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.extractor import INFO_OPTIONS, load_yt_dlp, ydl_pool  # noqa: E402
+
+COOKIE_HEADER = "SID=benchmark"
+
+
+def per_request_instance() -> None:
+    """Builds an instance the way every extraction did before the pool."""
+    YoutubeDL, _ = load_yt_dlp()
+    with YoutubeDL({**INFO_OPTIONS, 'http_headers': {"Cookie": COOKIE_HEADER}}) as ydl:
+        ydl.get_info_extractor('Youtube')
+
+
+def pool_instance() -> None:
+    """Builds an instance the way the pool does when none is idle."""
+    ydl_pool.create(INFO_OPTIONS, COOKIE_HEADER).close()
+
+
+def pooled_checkout() -> None:
+    """Checks out an idle instance and returns it."""
+    with ydl_pool.checkout(INFO_OPTIONS, COOKIE_HEADER):
+        pass
+
+
+def timed(function, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks the YoutubeDL instance pool.")
+    parser.add_argument("--iterations", type=int, default=20, help="The number of instances built per variant")
+    args = parser.parse_args()
+
+    # The first instance pays for the imports, which both variants share
+    per_request_instance()
+    pool_instance()
+    pooled_checkout()
+
+    print(f"instance per extraction: {timed(per_request_instance, args.iterations) * 1e3:.1f} ms")
+    print(f"pool instance creation:  {timed(pool_instance, args.iterations) * 1e3:.1f} ms")
+    print(f"pooled checkout:         {timed(pooled_checkout, args.iterations * 100) * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
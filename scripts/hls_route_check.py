@@ -0,0 +1,183 @@
+"""
+Runs the HLS manifest route with the default settings against a local stub upstream.
+
+With the manifest cache enabled (MANIFEST_CACHE_SIZE=512 by default), a cache miss
+is rewritten while it is received and stored once complete, and hits are rewritten
+from the cached body. The app is driven in-process through its middlewares, and
+the script exits with a message if any of the following does not hold:
+
+- the streamed miss and the cached hit of a manifest decrypt to the same playlist,
+- concurrent requests for an uncached manifest share one upstream fetch,
+- a request whose client disconnects mid-stream does not cache a partial manifest,
+  and the requests that joined it fetch the manifest again,
+- an upstream error is answered with 503 and leaves no call in flight,
+- manifests the upstream marks as no-store are streamed but not cached.
+
+Usage: python scripts/hls_route_check.py [--concurrency 20]
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from bench_hls import media_playlist  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.routes.v1.mfest.hls import manifest_cache, manifest_fetches  # noqa: E402
+from app.utils.config import settings  # noqa: E402
+from app.utils.crypto import Cryptography  # noqa: E402
+from app.utils.http import upstream  # noqa: E402
+
+UPSTREAM_PORT = 8770
+UPSTREAM = f"http://127.0.0.1:{UPSTREAM_PORT}"
+HEADERS = {"Referer": "http://localhost/", "X-Secret": settings.SECRET_KEY}
+TOKEN_PATTERN = re.compile(r"http://localhost/v1/manifest/(?:hls|segment)/([A-Za-z0-9_\-]+)\.(?:m3u8|ts)")
+MANIFEST = media_playlist(300).encode()
+
+# Number of upstream requests per manifest name
+fetches: Counter = Counter()
+
+
+def stub_app() -> web.Application:
+    """Builds the stub upstream, which sends the manifest in two halves 0.2 seconds apart."""
+    async def manifest(request: web.Request) -> web.StreamResponse:
+        name = request.match_info["name"]
+        fetches[name] += 1
+        if name.startswith("error"):
+            return web.Response(status=500)
+
+        response = web.StreamResponse(headers={"Content-Type": "application/vnd.apple.mpegurl"})
+        if name.startswith("nostore"):
+            response.headers["Cache-Control"] = "no-store"
+        await response.prepare(request)
+        half = len(MANIFEST) // 2
+        try:
+            await response.write(MANIFEST[:half])
+            await asyncio.sleep(0.2)
+            await response.write(MANIFEST[half:])
+            await response.write_eof()
+        except ConnectionResetError:
+            # The route released the connection of an aborted request
+            pass
+        return response
+
+    stub = web.Application()
+    stub.router.add_get("/api/manifest/hls_playlist/{name}/index.m3u8", manifest)
+    return stub
+
+
+def route(name: str) -> str:
+    """Builds the route path of an upstream manifest."""
+    token = Cryptography().minter("127.0.0.1").mint(f"{UPSTREAM}/api/manifest/hls_playlist/{name}/index.m3u8")
+    return f"/v1/manifest/hls/{token}.m3u8"
+
+
+def upstream_url(name: str) -> str:
+    return f"{UPSTREAM}/api/manifest/hls_playlist/{name}/index.m3u8"
+
+
+def normalize(text: str) -> str:
+    """Replaces the tokens by the URLs they encrypt."""
+    cryptography = Cryptography()
+    return TOKEN_PATTERN.sub(lambda match: "P:" + cryptography.decrypt_token(match.group(1))["url"], text)
+
+
+def check(condition: bool, message: str) -> None:
+    if not condition:
+        sys.exit(message)
+
+
+async def disconnected(path: str) -> None:
+    """Requests the path through ASGI and disconnects once the first body chunk is received."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"referer", b"http://localhost/"),
+                    (b"x-secret", settings.SECRET_KEY.encode())],
+        "client": ("127.0.0.1", 50000), "server": ("localhost", 80),
+    }
+    first_chunk = asyncio.Event()
+    requested = False
+
+    async def receive() -> dict:
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await first_chunk.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict) -> None:
+        if message["type"] == "http.response.body" and message.get("body"):
+            first_chunk.set()
+
+    await app(scope, receive, send)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Checks the HLS manifest route with the default settings.")
+    parser.add_argument("--concurrency", type=int, default=20, help="The number of concurrent requests")
+    args = parser.parse_args()
+
+    check(settings.MANIFEST_CACHE_SIZE > 0, "The manifest cache is disabled; run with the default settings")
+    runner = web.AppRunner(stub_app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", UPSTREAM_PORT).start()
+    transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 50000))
+    client = httpx.AsyncClient(transport=transport, base_url="http://localhost", headers=HEADERS)
+
+    try:
+        miss = await client.get(route("vod"))
+        check(miss.status_code == 200, f"Cache miss answered with {miss.status_code}")
+        check(manifest_cache.get(upstream_url("vod")) is not None, "The streamed manifest was not cached")
+        hit = await client.get(route("vod"))
+        check(hit.status_code == 200 and fetches["vod"] == 1, "The cache hit fetched the manifest again")
+        check(normalize(miss.text) == normalize(hit.text), "The streamed and the cached manifests differ")
+        check(miss.headers["Content-Type"] == hit.headers["Content-Type"], "The content types differ")
+        print(f"miss streamed and cached, hit served from the cache: equal {len(hit.text)} character manifests")
+
+        responses = await asyncio.gather(*(client.get(route("concurrent")) for _ in range(args.concurrency)))
+        check(all(response.status_code == 200 for response in responses), "A concurrent request failed")
+        check(len({normalize(response.text) for response in responses}) == 1, "The concurrent responses differ")
+        check(fetches["concurrent"] == 1, f"{args.concurrency} concurrent requests made {fetches['concurrent']} fetches")
+        print(f"{args.concurrency} concurrent requests: {fetches['concurrent']} upstream fetch")
+
+        leader = asyncio.ensure_future(disconnected(route("aborted")))
+        await asyncio.sleep(0.1)
+        followers = await asyncio.gather(*(client.get(route("aborted")) for _ in range(3)))
+        await leader
+        check(all(response.status_code == 200 for response in followers), "A request joining an aborted one failed")
+        check(normalize(followers[0].text) == normalize(hit.text), "The refetched manifest differs")
+        check(fetches["aborted"] == 2, f"The aborted manifest was fetched {fetches['aborted']} times")
+        print("client disconnected mid-stream: 3 joined requests answered from 1 refetch")
+
+        error = await client.get(route("error"))
+        check(error.status_code == 503, f"Upstream error answered with {error.status_code}")
+        # The finished call is removed by a done callback, on the next iteration of the loop
+        await asyncio.sleep(0)
+        check(not manifest_fetches.in_flight(upstream_url("error")), "The failed fetch is still in flight")
+        print("upstream error: 503, nothing in flight")
+
+        for _ in range(2):
+            nostore = await client.get(route("nostore"))
+            check(nostore.status_code == 200, f"no-store manifest answered with {nostore.status_code}")
+        check(manifest_cache.get(upstream_url("nostore")) is None and fetches["nostore"] == 2,
+              "The no-store manifest was cached")
+        print("no-store manifest: streamed on every request, not cached")
+        print(f"manifest_cache: {manifest_cache.stats()}, manifest_fetches: {manifest_fetches.stats()}")
+    finally:
+        await client.aclose()
+        await upstream.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,172 @@
+"""
+Checks that CustomHasher matches the original implementation and benchmarks both.
+
+Web clients compute the X-Sign signatures with their own copy of the hash, so
+the output must stay identical byte for byte. The original implementation is
+embedded below as the reference.
+
+Usage: python scripts/sign_check.py [--cases 20000] [--seed 1]
+"""
+
+import argparse
+import base64
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.sign import CustomHasher  # noqa: E402
+
+
+class BaselineHasher:
+    """The hasher as it was before its index tables were precomputed, kept verbatim as the reference."""
+
+    def __init__(self):
+        """Initialize constants and the S-box for non-linear transformation."""
+        self.buffer_size = 128
+        self.prime1 = 31
+        self.prime2 = 37
+        self.prime3 = 41
+        self.prime4 = 43
+        self.sbox = [
+            0x63, 0x7C, 0x77, 0x7B, 0xF2, 0x6B, 0x6F, 0xC5,
+            0x30, 0x01, 0x67, 0x2B, 0xFE, 0xD7, 0xAB, 0x76
+        ]
+
+    def custom_hash(self, input_str: str) -> str:
+        """
+        Hash the input string using custom transformations and permutations.
+
+        :param input_str: The string to hash.
+        :return: The first 128 characters of the base64-encoded hash.
+        """
+        buffer = self._initialize_buffer(input_str)
+        self._perform_chaotic_permutations(buffer)
+        self._final_permutation(buffer)
+        return self._convert_to_base64(buffer)
+
+    def _initialize_buffer(self, input_str: str) -> list:
+        """
+        Initialize the buffer with prime-based transformations and a dynamic XOR key.
+
+        :param input_str: The input string to initialize the buffer with.
+        :return: The initialized buffer.
+        """
+        buffer = [0] * self.buffer_size
+        dynamic_key = self.prime4
+
+        for i in range(len(input_str)):
+            buffer[i % self.buffer_size] = (
+                buffer[i % self.buffer_size] + ord(input_str[i]) * self.prime1
+            ) & 0xFF
+            buffer[(i + 1) % self.buffer_size] ^= (
+                ord(input_str[i]) * self.prime2
+            ) ^ dynamic_key
+            buffer[(i + 2) % self.buffer_size] = (
+                (buffer[(i + 2) % self.buffer_size] + ord(input_str[i]) * self.prime3)
+                & 0xFF
+            ) ^ self.sbox[i % len(self.sbox)]
+            dynamic_key = (dynamic_key * self.prime2) & 0xFF
+
+        return buffer
+
+    def _perform_chaotic_permutations(self, buffer: list):
+        """
+        Perform multi-round chaotic permutations on the buffer.
+
+        :param buffer: The buffer to permute.
+        """
+        for _r in range(3):
+            for i in range(len(buffer)):
+                # Left rotate
+                buffer[i] = (
+                    (buffer[i] << (i % 8)) | (buffer[i] >> (8 - (i % 8)))
+                ) & 0xFF
+                # XOR with dynamic S-box and key
+                buffer[i] ^= buffer[(i + self.prime1) % self.buffer_size] ^ self.sbox[
+                    (i + self.prime4) % len(self.sbox)
+                ]
+                buffer[i] = (
+                    (buffer[i] + buffer[(i * 5 + _r) % self.buffer_size]) * self.prime1
+                ) & 0xFF
+            buffer.reverse()  # Reverse buffer for additional permutation
+
+    def _final_permutation(self, buffer: list):
+        """
+        Apply final permutation and non-linear transformation to the buffer.
+
+        :param buffer: The buffer to transform.
+        """
+        for i in range(len(buffer)):
+            buffer[i] = self.sbox[buffer[i] % len(self.sbox)] ^ buffer[
+                (i * 7) % self.buffer_size
+            ]
+            buffer[i] ^= buffer[(i + self.prime3) % self.buffer_size]
+
+    @staticmethod
+    def _convert_to_base64(buffer: list) -> str:
+        """
+        Convert the buffer to a base64-encoded string.
+
+        :param buffer: The buffer to encode.
+        :return: The first 128 characters of the base64-encoded string.
+        """
+        base64_bytes = base64.b64encode(bytes(buffer))
+        base64_str = base64_bytes.decode("utf-8")
+        return base64_str[:128]
+
+
+ALPHABETS = (
+    string.printable,
+    "abcdef0123456789/?=&.-_",
+    "\u00e4\u00f6\u00fc\u00df\u00e9\u00e8\u00f1\u20ac\u6f22\u5b57\U0001f600 \x00\x7f" + string.ascii_letters,
+)
+# Lengths around the buffer size and the period of the dynamic key
+EDGE_CASES = ["", "a", "ab", "abc", "x" * 127, "x" * 128, "x" * 129, "x" * 255, "x" * 256, "\U0010FFFF" * 3]
+
+
+def generate_cases(count: int, seed: int) -> list[str]:
+    """Generates the edge cases and `count` random strings of 0 to 1200 characters."""
+    rnd = random.Random(seed)
+    cases = list(EDGE_CASES)
+    for _ in range(count):
+        alphabet = rnd.choice(ALPHABETS)
+        length = rnd.choice([rnd.randint(0, 10), rnd.randint(0, 300), rnd.randint(100, 1200)])
+        cases.append("".join(rnd.choice(alphabet) for _ in range(length)))
+    return cases
+
+
+def verify(cases: list[str]) -> None:
+    """Compares the outputs of both hashers, exiting with an error on the first difference."""
+    baseline, current = BaselineHasher(), CustomHasher()
+    for case in cases:
+        expected, actual = baseline.custom_hash(case), current.custom_hash(case)
+        if expected != actual:
+            sys.exit(f"Mismatch for {case[:80]!r}: expected {expected}, got {actual}")
+    print(f"Identical on {len(cases)} inputs")
+
+
+def benchmark(iterations: int = 5000) -> None:
+    """Times one hash of a 350-character segment URL with both hashers."""
+    url = "http://localhost:8000/v1/manifest/segment/" + "A" * 300 + ".ts"
+    for name, hasher in (("baseline", BaselineHasher()), ("current", CustomHasher())):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            hasher.custom_hash(url)
+        print(f"{name:>8}: {(time.perf_counter() - start) / iterations * 1e6:.1f} us per call")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Verifies and benchmarks CustomHasher against the original.")
+    parser.add_argument("--cases", type=int, default=20000, help="The number of random inputs")
+    parser.add_argument("--seed", type=int, default=1, help="The seed of the random inputs")
+    args = parser.parse_args()
+    verify(generate_cases(args.cases, args.seed))
+    benchmark()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Local Cloudflare Turnstile siteverify stub and a demonstration of the validator against it.
+
+The stub answers siteverify requests after a configurable latency: tokens starting
+with "0.fail" are rejected, all others succeed with a fresh challenge timestamp.
+TURNSTILE_VERIFY_URL is pointed at the stub before the application is imported,
+and the validator is run through:
+
+- malformed tokens, which are rejected locally without a siteverify request,
+- concurrent validations of one token, which share one siteverify request,
+- repeated validations of a verified token, which are served from the cache,
+- a token the stub rejects, which is not cached.
+
+With --serve only the stub is started, e.g. to run the application against it with
+TURNSTILE_VERIFY_URL=http://127.0.0.1:8769/turnstile/v0/siteverify DISABLE_TURNSTILE=0.
+
+Usage: python scripts/turnstile_stub.py [--latency 0.05] [--concurrency 50] [--serve]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+STUB_PORT = 8769
+VERIFY_URL = f"http://127.0.0.1:{STUB_PORT}/turnstile/v0/siteverify"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["TURNSTILE_VERIFY_URL"] = VERIFY_URL
+
+from app.utils.http import upstream  # noqa: E402
+from app.utils.turnstile import turnstile_validator  # noqa: E402
+
+# Number of siteverify requests received by the stub
+calls = 0
+
+
+def stub_app(latency: float) -> web.Application:
+    """Builds the siteverify stub."""
+    async def siteverify(request: web.Request) -> web.Response:
+        global calls
+        calls += 1
+        token = (await request.post()).get("response", "")
+        await asyncio.sleep(latency)
+        if token.startswith("0.fail"):
+            return web.json_response({"success": False, "error-codes": ["invalid-input-response"]})
+        challenge_ts = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        return web.json_response({"success": True, "challenge_ts": challenge_ts, "hostname": "localhost"})
+
+    app = web.Application()
+    app.router.add_post("/turnstile/v0/siteverify", siteverify)
+    return app
+
+
+async def timed(token: str, count: int = 1, concurrent: bool = False) -> tuple[list[bool], float]:
+    """Validates a token `count` times and returns the results and the time per validation in ms."""
+    start = time.perf_counter()
+    if concurrent:
+        results = await asyncio.gather(*(turnstile_validator.validate(token) for _ in range(count)))
+    else:
+        results = [await turnstile_validator.validate(token) for _ in range(count)]
+    return list(results), (time.perf_counter() - start) / count * 1000
+
+
+def report(name: str, results: list[bool], per_validation: float, calls_before: int) -> None:
+    accepted = sum(results)
+    print(f"{name}: {accepted}/{len(results)} accepted, {calls - calls_before} siteverify requests, "
+          f"{per_validation:.3f} ms per validation")
+
+
+async def demonstrate(latency: float, concurrency: int) -> None:
+    runner = web.AppRunner(stub_app(latency))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", STUB_PORT).start()
+    token = "0." + "A" * 300
+
+    try:
+        before = calls
+        for malformed in ("", "0.short", "1." + "A" * 300, "0." + "A" * 299 + "<", "0." + "A" * 3000):
+            results, per_validation = await timed(malformed)
+            report(f"malformed ({len(malformed)} characters)", results, per_validation, before)
+
+        before = calls
+        results, per_validation = await timed(token, concurrency, concurrent=True)
+        report(f"{concurrency} concurrent validations", results, per_validation, before)
+
+        before = calls
+        results, per_validation = await timed(token, 1000)
+        report("1000 repeated validations", results, per_validation, before)
+
+        before = calls
+        results, per_validation = await timed("0.fail" + "A" * 300, 3)
+        report("3 validations of a rejected token", results, per_validation, before)
+
+        print(f"validator counters: {turnstile_validator.stats()}")
+    finally:
+        await upstream.close()
+        await runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local Turnstile siteverify stub.")
+    parser.add_argument("--latency", type=float, default=0.05, help="The latency of the stub in seconds")
+    parser.add_argument("--concurrency", type=int, default=50, help="The number of concurrent validations")
+    parser.add_argument("--serve", action="store_true", help="Only run the stub")
+    args = parser.parse_args()
+
+    if args.serve:
+        print(f"Serving siteverify at {VERIFY_URL}")
+        web.run_app(stub_app(args.latency), host="127.0.0.1", port=STUB_PORT, print=None)
+    else:
+        asyncio.run(demonstrate(args.latency, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
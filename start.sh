@@ -6,5 +6,11 @@ PORT=${PORT:-8000}
 # Calculate the number of workers
 WORKERS=$(( $(nproc) * 2 + 1 ))
 
+if [ "${PRELOAD_APP:-0}" = "1" ]; then
+  # Import the application once and fork the workers from it, so they share the imported modules
+  exec gunicorn app.main:app --preload --workers $WORKERS --worker-class app.worker.UvicornWorker \
+    --bind=0.0.0.0:"$PORT"
+fi
+
 # Run the uvicorn server with the specified settings
 uvicorn app.main:app --workers $WORKERS --host=0.0.0.0 --port="$PORT" --loop uvloop --http h11